@@ -0,0 +1,80 @@
+"""Seeded file pairs to benchmark on.
+
+A pair is described by its size (lines), how many places differ (hunks), how much of
+the file changes (density, the fraction of lines touched) and how long lines are
+(width). The same description and seed always give the same two files.
+"""
+
+import os
+import random
+
+# Made up identifiers to build lines from, so lines look a bit like code and repeat a bit like code
+WORDS = ('value', 'count', 'index', 'name', 'result', 'item', 'data', 'total', 'node', 'key',
+         'self', 'return', 'if', 'for', 'in', 'None', 'True', 'append', 'len', 'range')
+
+
+class Spec:
+    """What a pair looks like."""
+
+    __slots__ = ('lines', 'hunks', 'density', 'width', 'seed')
+
+    def __init__(self, lines, hunks, density=0.05, width=60, seed=0) -> None:
+        self.lines = lines
+        self.hunks = hunks
+        self.density = density
+        self.width = width
+        self.seed = seed
+
+    @property
+    def name(self) -> str:
+        return '%dl-%dh-%gd-%dw' % (self.lines, self.hunks, self.density, self.width)
+
+    def params(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+def line(rnd, width) -> str:
+    indent = '    ' * rnd.randrange(4)
+    words = []
+    size = len(indent)
+    while size < width:
+        word = rnd.choice(WORDS) + (str(rnd.randrange(100)) if rnd.random() < 0.3 else '')
+        words.append(word)
+        size += len(word) + 1
+    return indent + ' '.join(words) + '\n'
+
+
+def make_pair(spec) -> tuple:
+    """The text of both files."""
+    rnd = random.Random(spec.seed)
+    first = [line(rnd, spec.width) for _ in range(spec.lines)]
+    second = list(first)
+
+    # Spread the changes over evenly sized stretches, one hunk per stretch
+    changed = max(1, int(spec.lines * spec.density))
+    per_hunk = max(1, changed // max(spec.hunks, 1))
+    stretch = spec.lines // max(spec.hunks, 1)
+    # Going from the end keeps the positions of the stretches before it the same
+    for hunk in reversed(range(spec.hunks)):
+        start = hunk * stretch + rnd.randrange(max(1, stretch - per_hunk))
+        kind = rnd.random()
+        if kind < 0.6:
+            second[start:start + per_hunk] = [line(rnd, spec.width) for _ in range(per_hunk)]
+        elif kind < 0.8:
+            del second[start:start + per_hunk]
+        else:
+            second[start:start] = [line(rnd, spec.width) for _ in range(per_hunk)]
+    return ''.join(first), ''.join(second)
+
+
+def write_pair(spec, directory) -> tuple:
+    """Writes the pair to directory (once) and returns both paths."""
+    path1 = os.path.join(directory, spec.name + '-%d.1.py' % spec.seed)
+    path2 = os.path.join(directory, spec.name + '-%d.2.py' % spec.seed)
+    if not (os.path.exists(path1) and os.path.exists(path2)):
+        text1, text2 = make_pair(spec)
+        with open(path1, 'w') as f:
+            f.write(text1)
+        with open(path2, 'w') as f:
+            f.write(text2)
+    return path1, path2
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""Benchmarks of the hot paths of mergepy, on the seeded pairs from corpus.py.
+
+Every case is timed a number of times and the median, min and max are kept:
+
+    diff/<algorithm>/<pair>   diff_hunks on the texts
+    build/<pair>              build_hunks from ready matching blocks
+    load/<pair>               diff_files, mapping both files and diffing the raw lines
+    cached/<pair>             diff_files again with the diff in the cache
+    mount/<pair>              MergePy with ready hunks until both side views are mounted
+    keep/<pair>               k on the highlighted hunk, until the screen is updated
+    replace/<pair>            alt+down to a conflict and r, until the screen is updated
+    undo/<pair>               ctrl+z, until the screen is updated
+    render/<pair>             rendering a screenful of the merged output from scratch
+
+The UI cases run headless through App.run_test and count until the screen has settled, so
+the scroll animation after a keypress is part of keep/replace/undo. Results are written as JSON, and a
+previous results file can be compared against:
+
+    python benchmarks/run.py [--suite quick|full] [--output results.json] [--compare old.json]
+
+With --compare the exit status is 1 when a case got slower than --threshold times its old median.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+# Session journals and cached diffs of the runs go somewhere thrown away, not next to the real ones
+os.environ['XDG_STATE_HOME'] = tempfile.mkdtemp(prefix='mergepy-state-')
+os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp(prefix='mergepy-cache-')
+# Only cached/<pair> is meant to hit the cache
+os.environ['MERGEPY_CACHE_SIZE'] = '0'
+
+from corpus import Spec, make_pair, write_pair  # noqa: E402
+from mergepy.cache import DEFAULT_SIZE  # noqa: E402
+from mergepy.diff import ALGORITHMS, matching_blocks  # noqa: E402
+from mergepy.hunks import build_hunks, diff_files, diff_hunks  # noqa: E402
+
+SUITES = {
+    'quick': [
+        Spec(2000, 20),
+        Spec(20000, 200),
+    ],
+    'full': [
+        Spec(2000, 20),
+        Spec(20000, 200),
+        Spec(100000, 1000),
+        # Same size, different shapes
+        Spec(20000, 20, density=0.2),
+        Spec(20000, 2000, density=0.2),
+        Spec(20000, 200, density=0.01),
+        Spec(20000, 200, width=20),
+        Spec(20000, 200, width=200),
+    ],
+}
+
+# The difflib engine is quadratic in places, past this many lines it's left out
+DIFFLIB_MAX_LINES = 20000
+
+
+def timed(function, repeat) -> list:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(times, spec) -> dict:
+    return {
+        'median': statistics.median(times),
+        'min': min(times),
+        'max': max(times),
+        'runs': len(times),
+        'params': spec.params(),
+    }
+
+
+def core_cases(spec, directory, repeat) -> dict:
+    results = {}
+    text1, text2 = make_pair(spec)
+    for algorithm in ALGORITHMS:
+        if algorithm == 'difflib' and spec.lines > DIFFLIB_MAX_LINES:
+            continue
+        results['diff/%s/%s' % (algorithm, spec.name)] = summary(
+            timed(lambda: diff_hunks(text1, text2, algorithm), repeat), spec)
+
+    lines1 = tuple(text1.splitlines(keepends=True))
+    lines2 = tuple(text2.splitlines(keepends=True))
+    blocks = matching_blocks(lines1, lines2, 'patience')
+    results['build/' + spec.name] = summary(timed(lambda: build_hunks(lines1, lines2, blocks), repeat), spec)
+
+    path1, path2 = write_pair(spec, directory)
+    results['load/' + spec.name] = summary(timed(lambda: diff_files(path1, path2, 'patience'), repeat), spec)
+
+    os.environ['MERGEPY_CACHE_SIZE'] = str(DEFAULT_SIZE)
+    try:
+        # Fills the cache, the timed runs all hit it (small pairs are never cached, for them it's load again)
+        diff_files(path1, path2, 'patience')
+        results['cached/' + spec.name] = summary(timed(lambda: diff_files(path1, path2, 'patience'), repeat), spec)
+    finally:
+        os.environ['MERGEPY_CACHE_SIZE'] = '0'
+    return results
+
+
+async def ui_cases(spec, directory, repeat) -> dict:
+    from mergepy.app import MergePy
+
+    path1, path2 = write_pair(spec, directory)
+    hunks = diff_files(path1, path2, 'patience')
+    results = {}
+
+    mounts = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        app = MergePy(path1, path2, hunks=hunks, resume=False)
+        async with app.run_test(size=(160, 50)) as pilot:
+            await pilot.pause()
+            mounts.append(time.perf_counter() - start)
+    results['mount/' + spec.name] = summary(mounts, spec)
+
+    app = MergePy(path1, path2, hunks=hunks, resume=False)
+    async with app.run_test(size=(160, 50)) as pilot:
+        await pilot.pause()
+
+        async def press(*keys) -> float:
+            start = time.perf_counter()
+            await pilot.press(*keys)
+            await pilot.pause()
+            return time.perf_counter() - start
+
+        keeps, replaces, undos = [], [], []
+        for _ in range(repeat):
+            keeps.append(await press('k'))
+            replaces.append(await press('alt+down', 'r'))
+        for _ in range(repeat):
+            undos.append(await press('ctrl+z'))
+        results['keep/' + spec.name] = summary(keeps, spec)
+        results['replace/' + spec.name] = summary(replaces, spec)
+        results['undo/' + spec.name] = summary(undos, spec)
+
+        # Fill the merged output with the whole first file, then draw the bottom screenful from scratch
+        mergeview = app.query_one('#mergeview')
+        for hunk in app.seq12:
+            mergeview.add_diff(hunk.text())
+        await pilot.pause()
+        bottom = max(0, len(mergeview.buffer) - 50)
+
+        def render():
+            mergeview.strips.clear()
+            mergeview.highlights.truncate(bottom)
+            for y in range(bottom, bottom + 50):
+                mergeview.render_line(y)
+
+        results['render/' + spec.name] = summary(timed(render, repeat), spec)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(results, baseline, threshold) -> bool:
+    """Prints how every case did against the baseline, True if none got slower than threshold."""
+    ok = True
+    for case, result in sorted(results.items()):
+        old = baseline.get(case)
+        if old is None:
+            print('%-45s %9.4fs  (new)' % (case, result['median']))
+            continue
+        ratio = result['median'] / old['median'] if old['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  SLOWER'
+            ok = False
+        print('%-45s %9.4fs  %9.4fs  x%.2f%s' % (case, old['median'], result['median'], ratio, flag))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of mergepy")
+    parser.add_argument("--suite", choices=sorted(SUITES), default='quick', help="which pairs to run on")
+    parser.add_argument("--repeat", type=int, default=5, help="times every case is run")
+    parser.add_argument("--only", help="only run cases whose name contains this")
+    parser.add_argument("--no-ui", action='store_true', help="skip the cases that need Textual")
+    parser.add_argument("--corpus", help="directory to keep the generated pairs in, a temporary one by default")
+    parser.add_argument("--output", default='benchmark.json', help="where to write the results")
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown against --compare that counts as a regression")
+    args = parser.parse_args()
+
+    directory = args.corpus or tempfile.mkdtemp(prefix='mergepy-corpus-')
+    os.makedirs(directory, exist_ok=True)
+
+    results = {}
+    for spec in SUITES[args.suite]:
+        print('pair ' + spec.name, file=sys.stderr)
+        results.update(core_cases(spec, directory, args.repeat))
+        if not args.no_ui:
+            results.update(asyncio.run(ui_cases(spec, directory, args.repeat)))
+    if args.only:
+        results = {case: result for case, result in results.items() if args.only in case}
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'suite': args.suite,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        sys.exit(0 if compare(results, baseline, args.threshold) else 1)
+    for case, result in sorted(results.items()):
+        print('%-45s %9.4fs' % (case, result['median']))
+
+
+if __name__ == '__main__':
+    main()
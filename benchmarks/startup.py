@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Startup budget of the mergepy entry point.
+
+Runs `python -X importtime -c "import mergepy"` a few times in fresh interpreters and
+checks the cumulative import time of mergepy against the target:
+
+    import mergepy  <= 40 ms  (median, on top of the interpreter's own startup)
+
+and that none of the UI stack (textual, rich, PySide6) got imported on the way, since
+--version, completions and --auto never need it. The import time of mergepy.app, the
+Textual UI, is printed too but has no target, it's only paid when merging interactively.
+
+Exits with 1 when over budget, so it can run in CI:
+
+    python benchmarks/startup.py [--runs N] [--target MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+TARGET_MS = 40
+UI_MODULES = ('textual', 'rich', 'PySide6')
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def importtime(module) -> tuple:
+    """Cumulative import time of module in ms, and the top level packages imported along with it."""
+    env = dict(os.environ, PYTHONPATH=SRC + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            env=env, stderr=subprocess.PIPE, text=True, check=True)
+    cumulative, packages = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, total, name = line.split('|')
+        name = name.strip()
+        packages.add(name.split('.')[0])
+        if name == module:
+            cumulative = int(total) / 1000
+    return cumulative, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup time of mergepy against its budget")
+    parser.add_argument("--runs", type=int, default=7, help="interpreters to start per measurement")
+    parser.add_argument("--target", type=float, default=TARGET_MS, help="budget for import mergepy in ms")
+    args = parser.parse_args()
+
+    # The first run also writes the .pyc files, it doesn't count
+    importtime('mergepy')
+    runs = [importtime('mergepy') for _ in range(args.runs)]
+    median = statistics.median(ms for ms, _ in runs)
+    loaded = sorted(set.union(*(packages for _, packages in runs)) & set(UI_MODULES))
+    app = statistics.median(importtime('mergepy.app')[0] for _ in range(3))
+
+    print('import mergepy      %6.1f ms (target %g ms)' % (median, args.target))
+    print('import mergepy.app  %6.1f ms' % app)
+    if loaded:
+        print('import mergepy pulled in ' + ', '.join(loaded))
+    sys.exit(1 if median > args.target or loaded else 0)
+
+
+if __name__ == '__main__':
+    main()
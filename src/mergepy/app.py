@@ -0,0 +1,1111 @@
+"""The Textual merge UI, only imported when merging interactively."""
+
+import os
+import platform
+import sys
+import subprocess
+from itertools import compress
+from pathlib import Path
+from textual import events, on, work, getters
+from textual.app import App, ComposeResult
+from textual.containers import HorizontalScroll, VerticalGroup, ScrollableContainer
+from textual.geometry import Size
+from textual.widgets import Label, Footer, Header, Static, Button, ListItem, ListView, DataTable, ProgressBar
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from rich.style import Style
+from .diff import DEFAULT_ALGORITHM, intraline
+from .hunks import HunkIndex, Kind, close, overwrites, release, stream_hunks
+from .highlight import HighlightCache, SliceSyntax, TailHighlightCache
+from .buffer import MergeBuffer
+from .history import History, Step
+from .journal import Journal
+from .merge3 import diff3_files
+from .tokens import diff_tokens
+from .state import SIDES, MergeState
+from .atomic import write_atomic
+from .auto import resolve
+from .metrics import HeightIndex, LineMetrics
+from .trace import mark, sample, span, traced
+
+def guess_language(file_path: str) -> str:
+    ext = Path(file_path).suffix.lower()
+    return {
+        ".py": "python",
+        ".js": "javascript",
+        ".ts": "typescript",
+        ".java": "java",
+        ".cpp": "cpp",
+        ".c": "c",
+        ".h": "c-header",
+        ".html": "html",
+        ".css": "css",
+        ".rb": "ruby",
+        ".php": "php",
+        ".rs": "rust",
+        ".go": "go",
+        ".swift": "swift",
+        ".json": "json",
+        ".yml": "yaml",
+        ".yaml": "yaml",
+        ".sh": "shell",
+        ".env": "shell",
+        ".bash": "bash",
+        ".zsh": "zsh",
+        ".csh": "csh",
+        ".fish": "fish",
+    }.get(ext, "unknown")
+
+# Marks the characters that changed inside a replaced line
+INTRALINE_STYLE = Style(reverse=True)
+
+# View a focused widget belongs to, by the id of the container it's in
+VIEWS = {'scrollview1': 'seq1', 'scrollview2': 'seq2', 'scrollview3': 'merge'}
+
+
+def render_strips(console, syntax, x) -> list:
+    """The lines of a SliceSyntax with line numbers as strips that start at column x of the view.
+
+    syntax has only the code from there on (its columns), left of x there's nothing to render.
+    """
+    lead = syntax.cache.number_width + 1
+    start, end = syntax.columns
+    options = console.options.update_width(lead + end - start)
+    # Right of the numbers column it's the code from start on, that's at column x
+    cut = min(x, lead)
+    return [Strip(segments).crop(cut) for segments in console.render_lines(syntax, options, pad=False)]
+
+
+class VisibleColumns:
+    """Only the columns on screen get rendered, for views that are as wide as their longest line.
+
+    That can be a line of a megabyte of minified JSON. Textual wants lines as wide as the
+    widget and crops them to what's on screen itself, so render_line() is left with the
+    strips in self.strips, rendered for self.columns (columns of the content), and put blank
+    space in front of them. Other columns on screen, scrolled sideways or on a wider
+    terminal, drop every line rendered so far, Textual's too.
+    """
+
+    columns = (0, 0)
+
+    def render_lines(self, crop):
+        left = self.gutter.left
+        columns = (max(0, crop.x - left), max(0, crop.right - left))
+        if columns != self.columns:
+            self.columns = columns
+            self.strips.clear()
+            self.refresh()
+        return super().render_lines(crop)
+
+    def code_columns(self) -> tuple:
+        """The columns of the code that self.columns show, right of the numbers column and the space after it."""
+        lead = self.highlights.number_width + 1
+        return max(0, self.columns[0] - lead), max(0, self.columns[1] - lead)
+
+    def placed(self, strip) -> Strip:
+        x = self.columns[0]
+        if x:
+            strip = Strip.join([Strip.blank(x, self.rich_style), strip])
+        return strip
+
+
+class Slice(VisibleColumns, ListItem):
+    """Base class for diff slices."""
+
+    # Lines rendered in one go when a line isn't in self.strips yet
+    CHUNK = 64
+
+    def __init__(self, seq, hunk, diff, lang, theme, highlights, metrics, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.seq = seq
+        self.hunk = hunk
+        self.highlights = highlights
+        self.id = hunk.id
+        self.linerange = hunk.linerange
+        self.diff = diff
+        self.lang = lang
+        self.theme = theme
+        self.width = metrics.max_width(hunk.start, hunk.end)
+        # Rendered lines by line of the slice
+        self.strips = {}
+
+    def render_chunk(self, y) -> None:
+        start = y - y % self.CHUNK
+        end = min(start + self.CHUNK, len(self.hunk))
+        columns = self.code_columns()
+        # Indent guides go by the start of a line, which is only there when it's on screen
+        syntax = SliceSyntax(self.highlights, self.hunk.start + start, self.hunk.start + end, self.theme, columns,
+                             line_numbers=True, indent_guides=columns[0] == 0)
+        self.stylize(syntax, start, end)
+        for line, strip in enumerate(render_strips(self.app.console, syntax, self.columns[0]), start):
+            self.strips[line] = strip
+
+    def stylize(self, syntax, start, end) -> None:
+        """Adds the styles of lines [start, end) of the slice to their syntax."""
+
+    def render_line(self, y) -> Strip:
+        if y >= len(self.hunk):
+            return Strip.blank(self.size.width, self.rich_style)
+        if y not in self.strips:
+            self.render_chunk(y)
+        # With the slice's own style under it, its background when it's highlighted
+        return self.placed(self.strips[y]).apply_style(self.rich_style)
+
+    def redraw(self) -> None:
+        """Renders the slice again, once its side text is highlighted."""
+        self.strips.clear()
+        self.refresh()
+
+    def action_focus_item(self) -> None:
+        self.parent.parent.parent.scroll_to_widget(self, center=True)
+
+        # Line up the same hunk in the other file, which might not be mounted yet
+        if self.hunk.peer:
+            other = 'seq2' if self.hunk.side == 'seq1' else 'seq1'
+            listView = self.parent.parent.parent.parent.get_widget_by_id(other, SideView)
+            listView.focus_hunk(self.hunk.peer, center=True)
+
+    def on_click(self) -> None:
+        self.action_focus_item()
+
+
+class DiffSlice(Slice):
+    """Highlights Diff Slice."""
+
+    def __init__(self, seq, hunk, diff, lang, theme, highlights, metrics, **kwargs) -> None:
+        super().__init__(seq, hunk, diff, lang, theme, highlights, metrics, **kwargs)
+        self.classes = hunk.kind.value
+        self.height = len(hunk) + 2
+        self.styles.height = len(hunk) + 2
+        self.virtual_size = Size(self.width, self.height)
+
+    def stylize(self, syntax, start, end) -> None:
+        # Columns are shifted by 2 for the '- '/'+ ' in front of every line, and back by where the code is cut off
+        first, last = syntax.columns
+        for offset, lo, hi in self.app.intraline(self.hunk):
+            lo, hi = max(lo + 2, first) - first, min(hi + 2, last) - first
+            if start <= offset < end and lo < hi:
+                syntax.stylize_range(INTRALINE_STYLE, (offset - start + 1, lo), (offset - start + 1, hi))
+
+
+class CommonSlice(Slice):
+    """Common Slice."""
+
+    def __init__(self, seq, hunk, diff, lang, theme, highlights, metrics, **kwargs) -> None:
+        super().__init__(seq, hunk, diff, lang, theme, highlights, metrics, **kwargs)
+        self.height = len(hunk)
+        self.styles.height = len(hunk)
+        self.virtual_size = Size(self.width, self.height)
+
+class SideView(ListView):
+    """List of the hunks of one file.
+
+    Only the slices in a window around what's on screen are mounted, the rest of
+    the hunks just live in self.hunks. The space they take up is kept as padding
+    above and below the window, so scrolling works as if they were all there.
+    """
+
+    # Slots mounted above and below the ones on screen
+    OVERSCAN = 50
+
+    def get_index(self) -> None:
+        if self.children:
+            hunk = self.next_hunk(-1)
+            if hunk:
+                self.focus_hunk(hunk)
+
+    def calibrate_dimensions(self) -> None:
+        self.height = self.heights.total
+        self.styles.height = "auto"
+        self.width = self.metrics.max_width()
+        self.styles.width = self.width
+        self.virtual_size = Size(self.width, self.height)
+        self.get_index()
+
+    def __init__(self, seq, id, seq2, diff, lang, theme, resolved=(), **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.seq = seq
+        self.id = id
+        self.index = 0
+        self.seq2 = seq2
+        self.diff = diff
+        self.lang = lang
+        self.theme = theme
+        self.highlights = HighlightCache(seq, lang)
+        self.metrics = LineMetrics(seq)
+        # A hunk keeps its slot for good, resolving it only sets the height of the slot to 0
+        self.hunks = HunkIndex(seq2)
+        # Hunks resolved before the view was made (in a resumed session) start out with no height
+        gone = [hunk in resolved for hunk in seq2]
+        for hunk in compress(seq2, gone):
+            self.hunks.resolve(hunk)
+        self.heights = HeightIndex(0 if resolved else self.slot_height(hunk) for hunk, resolved in zip(seq2, gone))
+        self.remaining = len(seq2) - sum(gone)
+        # Mounted slices by hunk and the slots they're taken from
+        self.widgets = {}
+        self.window = (0, min(len(seq2), 2 * self.OVERSCAN))
+        self.calibrate_dimensions()
+
+    @staticmethod
+    def slot_height(hunk) -> int:
+        # Diff slices have a border
+        return len(hunk) + 2 if hunk.kind is Kind.REPLACE else len(hunk)
+
+    def present(self, slot) -> bool:
+        return self.heights[slot] > 0
+
+    @property
+    def current(self):
+        """The hunk of the highlighted slice."""
+        child = self.highlighted_child
+        return child.hunk if child else None
+
+    def next_hunk(self, slot, step=1):
+        """First unresolved hunk after (or before, with step=-1) slot."""
+        # Resolved slots have no height, so the slot at the y right after (or before) this one is the next unresolved one
+        if step > 0:
+            slot = self.heights.find(self.heights.prefix(slot + 1))
+            return self.hunks[slot] if slot < len(self.hunks) else None
+        y = self.heights.prefix(slot) if slot > 0 else 0
+        return self.hunks[self.heights.find(y - 1)] if y > 0 else None
+
+    def make_slice(self, hunk) -> Slice:
+        if hunk.kind is Kind.REPLACE:
+            widget = DiffSlice(self.seq, hunk, self.diff, self.lang, self.theme, self.highlights, self.metrics)
+        else:
+            widget = CommonSlice(self.seq, hunk, self.diff, self.lang, self.theme, self.highlights, self.metrics)
+        self.widgets[hunk] = widget
+        return widget
+
+    def update_padding(self) -> None:
+        lo, hi = self.window
+        top = self.heights.prefix(lo)
+        bottom = self.heights.total - self.heights.prefix(hi)
+        self.styles.padding = (top, 0, bottom, 0)
+
+    def visible_window(self) -> tuple:
+        """Window of slots covering what's on screen plus the overscan."""
+        top = self.parent.scroll_y
+        first = self.heights.find(top)
+        last = self.heights.find(top + self.parent.size.height)
+        return max(0, first - self.OVERSCAN), min(len(self.hunks), last + self.OVERSCAN + 1)
+
+    def check_window(self, scroll_y) -> None:
+        lo, hi = self.visible_window()
+        # Only move the window once the screen gets within half an overscan of its edge
+        margin = self.OVERSCAN // 2
+        if (lo > 0 and lo + margin < self.window[0]) or (hi < len(self.hunks) and hi - margin > self.window[1]):
+            self.call_later(self.slide)
+
+    async def slide(self, focus=None, center=False, force=False) -> None:
+        """Mounts the slices around `focus` (or around what's on screen) in place of the current ones.
+
+        Nothing is done when that's the window as it is, unless forced.
+        """
+        if focus is not None:
+            slot = self.hunks.slots[focus]
+            lo, hi = max(0, slot - self.OVERSCAN), min(len(self.hunks), slot + self.OVERSCAN + 1)
+        else:
+            lo, hi = self.visible_window()
+        if (lo, hi) == self.window and not force:
+            return
+
+        current = focus or self.current
+        async with self.batch():
+            self.index = None
+            await self.remove_children()
+            self.widgets = {}
+            self.window = (lo, hi)
+            slices = [self.make_slice(self.hunks[slot]) for slot in range(lo, hi) if self.present(slot)]
+            self.update_padding()
+            await self.mount_all(slices)
+
+        if current not in self.widgets:
+            current = self.next_hunk(lo - 1)
+        if current in self.widgets:
+            self.select(current, center)
+
+    def select(self, hunk, center=False) -> None:
+        widget = self.widgets[hunk]
+        self.index = self.children.index(widget)
+        if center:
+            self.parent.scroll_to_widget(widget, center=True, force=True)
+
+    def focus_hunk(self, hunk, center=False) -> None:
+        """Highlights the slice of a hunk, mounting it first if it's outside the window."""
+        if not self.present(self.hunks.slots[hunk]):
+            return
+        if hunk in self.widgets:
+            self.select(hunk, center)
+        else:
+            self.call_later(self.slide, hunk, center)
+
+    def remove_hunk(self, hunk) -> None:
+        self.heights[self.hunks.slots[hunk]] = 0
+        self.hunks.resolve(hunk)
+        self.remaining -= 1
+        widget = self.widgets.pop(hunk, None)
+        if widget is not None and widget in self.children:
+            self.pop(self.children.index(widget))
+        self.update_padding()
+
+    def remove_hunks(self, hunks) -> None:
+        """remove_hunk for a batch of hunks, their slices all go in one DOM update."""
+        index = {child: i for i, child in enumerate(self.children)}
+        removed = []
+        for hunk in hunks:
+            self.heights[self.hunks.slots[hunk]] = 0
+            self.hunks.resolve(hunk)
+            widget = self.widgets.pop(hunk, None)
+            if widget in index:
+                removed.append(index[widget])
+        self.remaining -= len(hunks)
+        if removed:
+            self.remove_items(removed)
+        self.update_padding()
+
+    def restore_hunks(self, hunks) -> None:
+        """restore_hunk for a batch of hunks, the window gets mounted again in one go instead of a slice at a time."""
+        for hunk in hunks:
+            self.heights[self.hunks.slots[hunk]] = self.slot_height(hunk)
+            self.hunks.restore(hunk)
+        self.remaining += len(hunks)
+        self.update_padding()
+        self.call_later(self.slide, force=True)
+
+    def restore_hunk(self, hunk) -> None:
+        slot = self.hunks.slots[hunk]
+        self.heights[slot] = self.slot_height(hunk)
+        self.hunks.restore(hunk)
+        self.remaining += 1
+        lo, hi = self.window
+        if lo <= slot < hi:
+            # Goes in front of the first mounted slice that comes after it
+            index = len(self.children)
+            for i, child in enumerate(self.children):
+                if self.hunks.slots[child.hunk] > slot:
+                    index = i
+                    break
+            self.insert(index, [self.make_slice(hunk)])
+        self.update_padding()
+    
+    def scroll_item(self) -> None:
+        self.children[self.index].action_focus_item()
+    
+    def on_key(self, event: events.Key) -> None:
+        if event.key == 'space': 
+            self.scroll_item()
+        elif event.key == 'up' and self.index-1 >= 0:
+            self.parent.scroll_to_widget(self.children[self.index-1], center=True)
+        elif event.key == 'down' and self.index+1 <= len(self.children) - 1:
+            self.parent.scroll_to_widget(self.children[self.index+1], center=True)
+        elif event.key == 'left' or event.key == 'ctrl+left' or event.key == 'right' or event.key == 'ctrl+right':
+            self.parent.parent.parent.get_widget_by_id('mergeview').focus()
+        elif event.key == 'shift+up':
+            self.parent.scroll_up()
+        elif event.key == 'shift+down':
+            self.parent.scroll_down()
+        elif event.key == 'shift+left':
+            self.parent.scroll_page_left()
+        elif event.key == 'shift+right':
+            self.parent.scroll_page_right()
+        elif event.key == 'ctrl+up' or event.key == 'ctrl+down':
+            seq1 = self.parent.parent.get_widget_by_id('seq1')
+            seq2 = self.parent.parent.get_widget_by_id('seq2')
+            if self.id == 'seq1' and seq2.remaining >= 1:
+                self.parent.parent.get_widget_by_id('seq2').focus()
+            elif self.id == 'seq2' and seq1.remaining >= 1:
+                self.parent.parent.get_widget_by_id('seq1').focus()
+                
+        elif event.key == 'alt+up' or event.key == 'alt+down':
+            if self.current:
+                hunk = self.hunks.next_conflict(self.hunks.slots[self.current], -1 if event.key == 'alt+up' else 1)
+                if hunk:
+                    self.focus_hunk(hunk, center=True)
+                    self.sync_peer(hunk)
+
+    def sync_peer(self, hunk) -> None:
+        if hunk.peer:
+            other = 'seq2' if self.id == 'seq1' else 'seq1'
+            self.parent.parent.get_widget_by_id(other).focus_hunk(hunk.peer, center=True)
+
+    @work(thread=True)
+    def lex(self) -> None:
+        """Highlights the whole side text once, until that's done slices lex just their own lines."""
+        self.highlights.lex(self.theme)
+        self.app.call_from_thread(self.refresh_slices)
+
+    def refresh_slices(self) -> None:
+        for child in self.children:
+            child.redraw()
+
+    def on_mount(self) -> None:
+        self.lex()
+        self.watch(self.parent, 'scroll_y', self.check_window, init=False)
+        self.update_padding()
+        if self.id == 'seq1':
+            self.focus()
+
+    def compose(self) -> ComposeResult:
+        lo, hi = self.window
+        with span('compose side view', id=self.id, hunks=hi - lo):
+            for slot in range(lo, hi):
+                if self.present(slot):
+                    yield self.make_slice(self.hunks[slot])
+
+
+
+class MergeView(VisibleColumns, ScrollView):   
+
+    # Lines rendered in one go when a line isn't in self.strips yet
+    CHUNK = 64
+
+    def calibrate_dimensions(self) -> None:
+        self.height = self.buffer.height + 2 if self.buffer else 0
+        self.styles.height = self.height
+        # Numbers column, the space after it and the code, nothing gets wrapped
+        self.width = self.highlights.number_width + 1 + self.buffer.width if self.buffer else 0
+        self.styles.width = self.width
+        self.virtual_size = Size(self.width, self.height)
+
+    def __init__(self, texts, lang, theme, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.lang = lang
+        self.id = 'mergeview'
+        self.buffer = MergeBuffer(*texts)
+        self.highlights = TailHighlightCache(self.buffer, lang)
+        # Rendered lines by line number, only ever filled around the viewport
+        self.strips = {}
+        self.theme = theme
+        self.calibrate_dimensions()
+
+    @property
+    def text(self) -> str:
+        return str(self.buffer)
+    
+    def on_key(self, event: events.Key) -> None:
+        if event.key == 'ctrl+left' or event.key == 'ctrl+right':
+            seq1 = self.parent.parent.get_widget_by_id('seq1') 
+            seq2 = self.parent.parent.get_widget_by_id('seq2') 
+            if seq1.remaining >= 1: 
+                self.parent.parent.get_widget_by_id('seq1').focus()
+            elif seq2.remaining >= 1:
+                self.parent.parent.get_widget_by_id('seq2').focus()
+        elif event.key == 'up': 
+            self.parent.scroll_up()
+        elif event.key == 'shift+up':
+            self.parent.scroll_up()
+        elif event.key == 'down':
+            self.parent.scroll_down()
+        elif event.key == 'shift+down':
+            self.parent.scroll_down()
+        elif event.key == 'shift+left':
+            self.parent.scroll_left()
+        elif event.key == 'shift+right':
+            self.parent.scroll_right()
+           
+    def add_diff(self, *texts) -> None:
+        self.invalidate(len(self.buffer), lambda: self.buffer.append(*texts))
+        self.parent.scroll_end()
+
+    def remove_diff(self, range) -> None:
+        self.invalidate(len(self.buffer) - range, lambda: self.buffer.truncate(range))
+
+    def invalidate(self, line, change) -> None:
+        """Applies a change to the buffer from `line` on and drops what was rendered for it."""
+        number_width = self.highlights.number_width
+        change()
+        self.highlights.truncate(line)
+        if self.highlights.number_width != number_width:
+            # The numbers column got wider or narrower, every line moves
+            self.strips.clear()
+        else:
+            for y in [y for y in self.strips if y >= line]:
+                del self.strips[y]
+        self.calibrate_dimensions()
+        self.refresh()
+
+    def render_chunk(self, y) -> None:
+        start = y - y % self.CHUNK
+        end = min(start + self.CHUNK, len(self.buffer))
+        if len(self.strips) > 16 * self.CHUNK:
+            self.strips.clear()
+        columns = self.code_columns()
+        syntax = SliceSyntax(self.highlights, start, end, self.theme, columns, line_numbers=True, indent_guides=columns[0] == 0)
+        for line, strip in zip(range(start, end), render_strips(self.app.console, syntax, self.columns[0])):
+            self.strips[line] = strip
+
+    def render_line(self, y) -> Strip:
+        # Textual only asks for the lines that are on screen, and VisibleColumns for the columns that are
+        y += self.scroll_offset.y
+        if y >= len(self.buffer):
+            return Strip.blank(self.size.width, self.rich_style)
+        if y not in self.strips:
+            self.render_chunk(y)
+        return self.placed(self.strips[y])
+
+class MergePy(App):
+    
+    CSS_PATH = "merge.tcss"
+
+    # ("space", "nothing('2')", "Select Conflict")
+    BINDINGS = [
+        ("Ctrl-↑/↓/←/→", "   ", "Next window"),
+        ("Shift-↑/↓/←/→", "    ", "Scroll"),
+        ("Alt-↑/↓", "next_conflict", "Next Conflict"),
+        ("Spacebar", "sync", "Sync"),
+        ("Enter", "replace_keep", "Replace/Keep"),
+        ("r", "replace", "Replace Block"),
+        ("k", "keep", "Keep Block"),
+        ("d", "delete", "Delete Block"),
+        ("c", "keep_to_conflict", "Keep To Conflict"),
+        ("L", "resolve_all('left')", "All Left"),
+        ("R", "resolve_all('right')", "All Right"),
+        ("B", "resolve_all('both')", "All Both"),
+        ("q", "quit", "Quit"),
+        ("ctrl+z", "undo", "Undo"),
+        ("ctrl+y", "redo", "Redo"),
+        ("ctrl+s", "save", "Save"),
+     ]
+
+    diff = reactive('') 
+
+    def __init__(self, file_path1: Path, file_path2: Path, output=None, algorithm=DEFAULT_ALGORITHM, jobs=1, undo_depth=None, hunks=None, resume=True, base=None, unit='lines', **kwargs):
+        super().__init__(**kwargs)
+
+        self.file_path1 = file_path1
+        self.file_path2 = file_path2
+        self.output = None 
+        if output:
+            self.output = output
+        self.algorithm = algorithm
+        self.jobs = jobs
+        # With a base it's a three-way merge, what only one file changed is merged before anything is shown
+        self.base = base
+        # Diffed by lines, or by words or tokens (see tokens.UNITS) for files of very long lines
+        self.unit = unit
+        # Keeps at most undo_depth steps, all of them without one
+        self.history = History(undo_depth)
+        # Whether the merge got written somewhere
+        self.saved = False
+        
+        if Path(self.file_path1).suffix:
+            self.lang = guess_language(self.file_path1)
+        elif Path(self.file_path2).suffix:
+            self.lang = guess_language(self.file_path2)
+        # Else we just pretend its a shell language
+        else:
+            self.lang = 'shell'
+
+        # Every step goes into the journal, from which the next session of these files picks up if this one
+        # doesn't end with everything saved. Picking up needs no diff, the hunks are in the journal too
+        # (a three-way merge is merged again, its diffs usually come out of the cache).
+        self.journal = Journal(file_path1, file_path2, base, unit)
+        self.session = self.journal.replay(undo_depth, algorithm, jobs) if resume else None
+        self.resolved = set()
+        # Texts of the hunks in the output
+        self.merged = []
+        if self.session is not None:
+            hunks = self.session.hunks
+            self.history = self.session.history
+            self.resolved = self.session.resolved
+            self.merged = self.session.texts()
+
+        # Focus, what's highlighted, what's left, all that bindings and layout follow from.
+        # Acted on once whatever is being handled now is done, not for every change.
+        self.state = MergeState(self.call_later)
+        self.state.watch(self.state_changed)
+        # Available actions as the footer last showed them, and what was left of both sides at the last flush
+        self.allowed = None
+        self.remaining = None
+        # Hunks can come diffed already, from the pool of a directory merge, otherwise
+        # the diff runs in a worker once the app is up. Until it's done there's only something to look at.
+        self.state.diffing = hunks is None
+        self.set_hunks(hunks or [])
+
+    @property
+    def diffing(self) -> bool:
+        return self.state.diffing
+
+    def set_hunks(self, hunks) -> None:
+        self.seq = hunks
+        self.seq12 = [hunk for hunk in self.seq if hunk.side == 'seq1']
+        self.seq22 = [hunk for hunk in self.seq if hunk.side == 'seq2']
+
+        # Character level differences of replace hunks, filled in by intraline() 
+        self.intraline_cache = {}
+
+        # Side texts as shown in the side views, with a '- '/'+ '/'  ' marker in front of every line
+        self.seq1 = ''.join([hunk.marked() for hunk in self.seq12])
+        self.seq2 = ''.join([hunk.marked() for hunk in self.seq22])
+
+    @work(thread=True, exclusive=True)
+    def diff_files(self) -> None:
+        """Diffs the files, showing the start of the diff as soon as there is one."""
+        if self.base:
+            hunks, merged, conflicts = diff3_files(self.base, self.file_path1, self.file_path2, self.algorithm, self.jobs)
+            self.journal.start(hunks)
+            self.call_from_thread(self.diff_progress, 1, 1, hunks)
+            self.call_from_thread(self.notify, "%d changes merged, %d left to resolve" % (merged, conflicts), title="Merged with the base")
+            return
+        if self.unit != 'lines':
+            # Tokens aren't streamed, there are no regions of lines to show early
+            hunks = diff_tokens(self.file_path1, self.file_path2, self.unit, self.algorithm, self.jobs)
+            self.journal.start(hunks)
+            self.call_from_thread(self.diff_progress, 1, 1, hunks)
+            return
+        for done, total, hunks in stream_hunks(self.file_path1, self.file_path2, self.algorithm, self.jobs):
+            if done == total:
+                # Hashing the files for the journal happens here too, before any step can be taken
+                self.journal.start(hunks)
+            self.call_from_thread(self.diff_progress, done, total, hunks)
+
+    @traced('diff progress')
+    async def diff_progress(self, done, total, hunks) -> None:
+        progress = self.get_widget_by_id('progress', ProgressBar)
+        progress.update(total=total, progress=done)
+        if hunks is not None:
+            self.set_hunks(hunks)
+            await self.show_hunks()
+        if done == total:
+            progress.remove()
+            self.state.update(diffing=False)
+        self.update_state()
+
+    @traced('show hunks', painted=True)
+    async def show_hunks(self) -> None:
+        """Swaps the side views for ones showing self.seq."""
+        for id, text, hunks in (('seq1', self.seq1, self.seq12), ('seq2', self.seq2, self.seq22)):
+            view = self.get_widget_by_id(id, SideView)
+            parent = view.parent
+            await view.remove()
+            await parent.mount(SideView(text, id, hunks, self.diff, self.lang, 'ansi_dark'))
+
+    def intraline(self, hunk) -> list:
+        """Changed character ranges for one side of a replace hunk, worked out the first time it's drawn."""
+        if hunk.number not in self.intraline_cache:
+            hunk1, hunk2 = (hunk, hunk.peer) if hunk.side == 'seq1' else (hunk.peer, hunk)
+            self.intraline_cache[hunk.number] = intraline(hunk1.text(), hunk2.text())
+        return self.intraline_cache[hunk.number][0 if hunk.side == 'seq1' else 1]
+
+    def on_mount(self) -> None:
+        self.title = 'diff ' + str(self.file_path1) + ' ' + str(self.file_path2)
+        if self.base:
+            self.title = 'merge ' + str(self.file_path1) + ' ' + str(self.file_path2) + ' from ' + str(self.base)
+        mark('mounted')
+        self.call_after_refresh(self.first_paint)
+        self.watch(self.screen, 'focused', self.focus_changed)
+        self.update_state()
+        if self.diffing:
+            self.diff_files()
+        elif self.session is not None:
+            self.notify("Picked up the last session of these files, %d steps" % self.session.steps, title="Resumed")
+        else:
+            self.journal.start(self.seq)
+    
+    def first_paint(self) -> None:
+        mark('first paint')
+        sample(self)
+
+    def on_key(self, event: events.Key) -> None:
+        # Enter in the command palette is the palette's
+        if event.key == 'enter' and not self.screen.is_modal and self.state.side != 'merge':
+            self.action_replace_keep()
+
+    def on_click(self) -> None:
+        if not self.screen.is_modal and self.get_widget_by_id('scrollview3').has_focus:
+            self.get_widget_by_id('mergeview').focus()
+
+    def focus_changed(self, focused) -> None:
+        side = None
+        for node in focused.ancestors_with_self if focused else ():
+            if node.id in VIEWS:
+                side = VIEWS[node.id]
+                break
+        self.state.update(side=side)
+
+    def on_list_view_highlighted(self, event: ListView.Highlighted) -> None:
+        self.update_state()
+
+    def update_state(self) -> None:
+        """Brings self.state up to date with the views, after anything that may have changed them."""
+        views = [self.get_widget_by_id(id, SideView) for id in SIDES]
+        self.state.update(
+            current={view.id: view.current.kind if view.current else None for view in views},
+            remaining={view.id: view.remaining for view in views},
+            merged=len(self.get_widget_by_id('mergeview', MergeView).buffer),
+            can_undo=self.history.can_undo(),
+            can_redo=self.history.can_redo(),
+        )
+
+    def state_changed(self, state) -> None:
+        # The footer asks check_action about every binding when it's redrawn, so only when that changes something
+        allowed = [state.allows(action.partition('(')[0]) for _, action, _ in self.BINDINGS]
+        if allowed != self.allowed:
+            self.allowed = allowed
+            self.refresh_bindings()
+        if state.remaining != self.remaining:
+            self.remaining = state.remaining
+            self.check_empty()
+
+    def check_empty(self) -> None:
+        remaining = self.state.remaining
+        if remaining['seq1'] == 0 and remaining['seq2'] > 0:
+            self.get_widget_by_id('seq2').focus() 
+        elif remaining['seq1'] > 0 and remaining['seq2'] == 0:
+            self.get_widget_by_id('seq1').focus() 
+        elif remaining['seq1'] == 0 and remaining['seq2'] == 0 and self.state.merged > 0:
+            self.get_widget_by_id('mergeview').focus()
+
+    def sides(self) -> tuple:
+        """The side view with the focus (the second one when neither has it) and the other one."""
+        id, other = ('seq1', 'seq2') if self.state.side == 'seq1' else ('seq2', 'seq1')
+        return self.get_widget_by_id(id, SideView), self.get_widget_by_id(other, SideView)
+
+    @traced('next_conflict', painted=True)
+    def action_next_conflict(self) -> None: 
+        list = self.sides()[0]
+        if list.current:
+            hunk = list.hunks.next_conflict(list.hunks.slots[list.current])
+            if hunk:
+                list.focus_hunk(hunk, center=True)
+                list.sync_peer(hunk)
+     
+    @traced('sync', painted=True)
+    def action_sync(self) -> None:
+        self.sides()[0].scroll_item()
+
+    @traced('replace', painted=True)
+    def action_replace(self) -> None:
+        target = self.get_widget_by_id('mergeview', MergeView)
+        list, list2 = self.sides()
+
+        hunk = list.current
+        # The other side may have been kept or deleted on its own already, then it's not this step's to undo
+        peer = list2.present(list2.hunks.slots[hunk.peer])
+        text = hunk.text()
+        self.record(Step('replace', (hunk.id, hunk.peer.id) if peer else (hunk.id,), len(target.buffer), MergeBuffer.count(text)))
+        list.remove_hunk(hunk)
+        if peer:
+            list2.remove_hunk(hunk.peer)
+        target.add_diff(text)
+        
+        self.state.relayout(list)
+        self.state.relayout(list2)
+        self.update_state()
+
+    @traced('keep', painted=True)
+    def action_keep(self) -> None:
+        target = self.get_widget_by_id('mergeview', MergeView)
+        list, list2 = self.sides()
+        
+        hunk = list.current
+        # Common hunks are the same on both sides, so they go together
+        ids = (hunk.id, hunk.peer.id) if hunk.kind is Kind.COMMON else (hunk.id,)
+        text = hunk.text()
+        self.record(Step('keep', ids, len(target.buffer), MergeBuffer.count(text)))
+        target.add_diff(text)
+        
+        if hunk.kind is Kind.COMMON:
+            list2.remove_hunk(hunk.peer)
+            self.state.relayout(list2)
+
+        list.remove_hunk(hunk)
+        self.state.relayout(list)
+        self.update_state()
+
+    @traced('delete', painted=True)
+    def action_delete(self) -> None:
+        target = self.get_widget_by_id('mergeview', MergeView)
+        list, list2 = self.sides()
+        
+        hunk = list.current
+        ids = (hunk.id, hunk.peer.id) if hunk.kind is Kind.COMMON else (hunk.id,)
+        self.record(Step('delete', ids, len(target.buffer), 0))
+        list.remove_hunk(hunk)
+        self.state.relayout(list)
+        if hunk.kind is Kind.COMMON:
+            list2.remove_hunk(hunk.peer)
+            self.state.relayout(list2)
+        self.update_state()
+
+    @traced('replace_keep', painted=True)
+    def action_replace_keep(self) -> None:
+        # Enter comes straight from on_key, not through check_action
+        if self.diffing:
+            return
+        list = self.sides()[0]
+        # if list still has entries
+        if list.current:
+            if list.current.kind is Kind.REPLACE:
+                self.action_replace()
+            else:
+                self.action_keep() 
+
+    def unresolved(self) -> list:
+        """Hunks of both sides that are left, in diff order."""
+        views = {id: self.get_widget_by_id(id, SideView) for id in SIDES}
+        return [hunk for hunk in self.seq if views[hunk.side].present(views[hunk.side].hunks.slots[hunk])]
+
+    def resolve_batch(self, action, kept, dropped) -> None:
+        """Resolves a batch of hunks as one step, kept ones go into the output in order, dropped ones don't.
+
+        The output gets all of it in one go and each side view loses its slices in one DOM update.
+        """
+        target = self.get_widget_by_id('mergeview', MergeView)
+        ids = tuple(hunk.id for hunk in kept + dropped)
+        texts = [hunk.text() for hunk in kept]
+        self.record(Step(action, ids, len(target.buffer), MergeBuffer.count(*texts), len(kept)))
+        for list, hunks in self.find_hunks(ids):
+            list.remove_hunks(hunks)
+            self.state.relayout(list)
+        if texts:
+            target.add_diff(*texts)
+        self.update_state()
+
+    @traced('resolve_all', painted=True)
+    def action_resolve_all(self, policy) -> None:
+        """Resolves everything that's left the way --auto does with policy, in one step."""
+        hunks = self.unresolved()
+        kept = resolve(hunks, policy)
+        if kept is None:
+            self.notify("There are conflicts left", title="Not resolved", severity='warning')
+            return
+        keep = set(kept)
+        self.resolve_batch('resolve ' + policy, kept, [hunk for hunk in hunks if hunk not in keep])
+
+    @traced('keep_to_conflict', painted=True)
+    def action_keep_to_conflict(self) -> None:
+        """Keeps everything up to the next conflict the way 'both' does, in one step.
+
+        That's the common lines once and the lines only one side has, so what's left
+        starts at a conflict.
+        """
+        hunks = []
+        for hunk in self.unresolved():
+            if hunk.kind is Kind.REPLACE:
+                break
+            hunks.append(hunk)
+        if hunks:
+            kept = resolve(hunks, 'both')
+            keep = set(kept)
+            self.resolve_batch('keep to conflict', kept, [hunk for hunk in hunks if hunk not in keep])
+
+    def record(self, step) -> None:
+        self.history.record(step)
+        self.journal.record(step)
+
+    def find_hunk(self, id) -> tuple:
+        """The side view a hunk id belongs to and the hunk itself."""
+        for list in (self.get_widget_by_id('seq1'), self.get_widget_by_id('seq2')):
+            hunk = list.hunks.ids.get(id)
+            if hunk is not None:
+                return list, hunk
+        raise KeyError(id)
+
+    def find_hunks(self, ids) -> list:
+        """find_hunk for a batch of ids, as (side view, its hunks out of ids) for both sides."""
+        views = [self.get_widget_by_id(id, SideView) for id in SIDES]
+        return [(view, [view.hunks.ids[id] for id in ids if id in view.hunks.ids]) for view in views]
+
+    @traced('undo', painted=True)
+    def action_undo(self) -> None:
+        if self.history.can_undo(): 
+            seq1 = self.get_widget_by_id('seq1') 
+            if seq1.highlighted_child:
+                seq1.highlighted_child.highlighted = False
+            seq2 = self.get_widget_by_id('seq2')
+            if seq2.highlighted_child:
+                seq2.highlighted_child.highlighted = False  
+            target = self.get_widget_by_id('mergeview', MergeView)
+            
+            step = self.history.undo()
+            self.journal.undo()
+            if step.length:
+                target.remove_diff(len(target.buffer) - step.offset)
+            # Restores the peer too when both sides were resolved in one go
+            if len(step.ids) > 2:
+                # A batch, both windows are mounted again instead of a slice at a time
+                for list, hunks in self.find_hunks(step.ids):
+                    list.restore_hunks(hunks)
+                    self.state.relayout(list)
+            else:
+                for id in step.ids:
+                    list, hunk = self.find_hunk(id)
+                    list.restore_hunk(hunk)
+                    self.state.relayout(list)
+            self.update_state()
+
+    @traced('redo', painted=True)
+    def action_redo(self) -> None: 
+        target = self.get_widget_by_id('mergeview', MergeView)
+         
+        if self.history.can_redo():
+            step = self.history.redo()
+            self.journal.redo()
+            for list, hunks in self.find_hunks(step.ids):
+                list.remove_hunks(hunks)
+                self.state.relayout(list)
+            if step.length:
+                target.add_diff(*(self.find_hunk(id)[1].text() for id in step.ids[:step.texts]))
+            self.update_state()
+   
+    @traced('save', painted=True)
+    def action_save(self) -> None: 
+        
+        target = self.get_widget_by_id('mergeview', MergeView) 
+        # The worker writes out the merge as it is now, merging can go on meanwhile
+        lines = target.buffer.output()
+        
+        if self.output: 
+            self.save(lines, self.journal.entries, self.output)
+        # If we're on linux, use zenity (from the worker too, so the UI doesn't wait on it)
+        elif platform.system() == 'Linux':
+            self.save(lines, self.journal.entries)
+            
+        # Otherwise default to PySide6
+        else:
+            # Qt takes a while to load, so only when it's actually needed
+            from PySide6.QtWidgets import QApplication, QFileDialog
+            app = QApplication.instance() or QApplication(sys.argv) 
+            ext = str(Path(self.file_path1).suffix.lower()) 
+            lang = str(guess_language(self.file_path1)) 
+            if lang == 'unknown':
+                ext, lang = '',''
+            if not lang == '' and not ext == '':
+                lang = lang.capitalize() + ' Files'     
+                lang = lang + " (*." + ext + ");;" 
+            # Qt wants its dialogs on the main thread, only the writing goes to the worker
+            filepath, _ = QFileDialog.getSaveFileName(None, "Save file", str(self.file_path1), lang + "All files (*.*)")
+            if filepath:
+                self.save(lines, self.journal.entries, filepath)
+
+    @work(thread=True, group='save')
+    def save(self, lines, entries, filepath=None) -> None:
+        """Writes lines to filepath (asking zenity for one without it) through a temporary file and a rename."""
+        if filepath is None:
+            result = subprocess.run(["zenity", "--file-selection", "--save","--filename=" + str(self.file_path1)], capture_output=True, text=True)
+            filepath = result.stdout.strip()
+            if not filepath:
+                return
+        try:
+            self.call_from_thread(self.release_inputs, filepath)
+            write_atomic(filepath, lines)
+        except OSError as error:
+            self.call_from_thread(self.notify, str(error), title="Not saved", severity='error')
+            return
+        self.call_from_thread(self.saved_to, entries)
+
+    def release_inputs(self, filepath) -> None:
+        # Saving over one of the files: Windows won't replace it while it's mapped, and the hunks
+        # have to keep showing what it was. On the UI thread, that's where the lines are read.
+        if overwrites(filepath, self.file_path1, self.file_path2, self.base):
+            release(self.seq)
+
+    def saved_to(self, entries) -> None:
+        self.saved = True
+        self.journal.saved(entries)
+        self.notify("File saved!", title="Saved") 
+
+    async def action_quit(self) -> None:
+        # A save that's still being written gets to finish first
+        await self.workers.wait_for_complete([worker for worker in self.workers if worker.group == 'save'])
+        self.journal.close()
+        self.exit()
+
+
+    def check_action(self, action: str, parameters: tuple[object, ...]) -> bool | None:  
+        # Check if an action may run, that's all in self.state
+        return self.state.allows(action)
+
+    def toggle_dark(self):
+        self.dark = not self.dark
+
+    def compose(self) -> ComposeResult:
+        # A scrollable container for the file contents
+        # yield Header()
+       
+        with span('compose'):
+            with VerticalGroup():
+                if self.diffing:
+                    yield ProgressBar(id='progress', show_eta=False)
+                yield Label(str(self.file_path1))
+                with HorizontalScroll(id='scrollview1'):
+                    yield SideView(self.seq1, 'seq1', self.seq12, self.diff, self.lang, 'ansi_dark', self.resolved)
+                yield Label(str(self.file_path2))
+                with HorizontalScroll(id='scrollview2'):
+                    yield SideView(self.seq2, 'seq2', self.seq22, self.diff, self.lang, 'ansi_dark', self.resolved)
+            with ScrollableContainer(id='scrollview3'):
+                yield MergeView(self.merged, self.lang, 'ansi_dark')
+       
+        yield Footer()
+
+
+class PairsView(App):
+    """Summary of a directory merge, Enter merges the highlighted pair."""
+
+    BINDINGS = [
+        ("Enter", "    ", "Merge"),
+        ("q", "quit", "Quit"),
+    ]
+
+    def __init__(self, queue, row=0, **kwargs):
+        super().__init__(**kwargs)
+        self.queue = queue
+        self.row = row
+
+    def compose(self) -> ComposeResult:
+        yield DataTable(cursor_type='row', id='pairs')
+        yield Footer()
+
+    def on_mount(self) -> None:
+        table = self.query_one(DataTable)
+        _, self.status_column = table.add_columns('File', 'Status')
+        for row, pair in enumerate(self.queue.pairs):
+            self.queue.update(pair)
+            table.add_row(pair.name, pair.status, key=str(row))
+        table.move_cursor(row=self.row)
+        self.update_title()
+        # Pairs keep coming out of the pool while this is open
+        self.set_interval(0.25, self.update_statuses)
+
+    def update_title(self) -> None:
+        pairs = self.queue.pairs
+        self.title = '%d pairs, %d identical, %d merged, %d conflicts' % (
+            len(pairs), sum(pair.identical for pair in pairs), sum(pair.merged for pair in pairs), sum(pair.conflicts or 0 for pair in pairs))
+
+    def update_statuses(self) -> None:
+        table = self.query_one(DataTable)
+        for row, pair in enumerate(self.queue.pairs):
+            status = pair.status
+            self.queue.update(pair)
+            if pair.status != status:
+                table.update_cell(str(row), self.status_column, pair.status)
+        self.update_title()
+
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        pair = self.queue.pairs[int(event.row_key.value)]
+        if pair.future is None or pair.identical:
+            self.notify("Nothing to merge", title=pair.name)
+        else:
+            self.exit(pair)
+
+
+def merge_pairs(queue, output=None, algorithm=DEFAULT_ALGORITHM, undo_depth=None, resume=True) -> None:
+    """Goes back and forth between the summary and a MergePy for every pair that gets picked."""
+    row = 0
+    while True:
+        pair = PairsView(queue, row).run()
+        if pair is None:
+            break
+        target = None
+        if output:
+            target = os.path.join(output, pair.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+        app = MergePy(pair.file1, pair.file2, target, algorithm=algorithm, undo_depth=undo_depth, hunks=queue.hunks(pair), resume=resume)
+        app.run()
+        # Built again from the blocks if the pair gets opened again
+        close(app.seq)
+        pair.merged = pair.merged or app.saved
+        row = min(queue.pairs.index(pair) + 1, len(queue.pairs) - 1)
@@ -0,0 +1,53 @@
+"""Writing a file so it's either all there or not changed at all."""
+
+import os
+import stat
+from itertools import count
+
+from .paths import remove
+
+
+def write_atomic(path, lines) -> None:
+    """Writes lines to a temporary file next to path, syncs it to disk and renames it over path.
+
+    A crash or a full disk halfway leaves path as it was, never cut short. The new file
+    gets the permissions of the one it replaces.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    for n in count():
+        # 'x' never opens a file that's already there, so two saves never share a temporary file
+        temporary = os.path.join(directory, '.%s.%d.%d.tmp' % (name, os.getpid(), n))
+        try:
+            f = open(temporary, 'x', encoding='utf-8')
+        except FileExistsError:
+            continue
+        break
+    try:
+        with f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temporary, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(temporary, path)
+    except BaseException:
+        remove(temporary)
+        raise
+    sync_directory(directory)
+
+
+def sync_directory(directory) -> None:
+    """Makes the rename itself survive a power cut, where the OS lets a directory be synced."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Windows can't open a directory
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,105 @@
+"""Merging without the UI, every hunk is resolved by the same policy."""
+
+import os
+import sys
+
+from .atomic import write_atomic
+from .diff import DEFAULT_ALGORITHM
+from .hunks import Kind, close, diff_files, overwrites, release
+
+# left/right take that file's side of every change, both takes the first file's lines and then the
+# second's, fail-on-conflict takes lines only one file has and gives up on replaced lines
+POLICIES = ('left', 'right', 'both', 'fail-on-conflict')
+
+
+def resolve(hunks, policy) -> list:
+    """The hunks that make up the merged file, None if the policy gives up on a conflict."""
+    if policy == 'left':
+        return [hunk for hunk in hunks if hunk.side == 'seq1']
+    if policy == 'right':
+        return [hunk for hunk in hunks if hunk.side == 'seq2']
+    if policy == 'fail-on-conflict' and any(hunk.kind is Kind.REPLACE for hunk in hunks):
+        return None
+    # Hunks come in diff order, common ones just shouldn't be in there twice
+    return [hunk for hunk in hunks if not (hunk.kind is Kind.COMMON and hunk.side == 'seq2')]
+
+
+def auto_merge(file1, file2, output, policy, algorithm=DEFAULT_ALGORITHM, jobs=1, base=None, unit='lines') -> int:
+    """Merges file1 and file2 into output (stdout without one), returns the exit status.
+
+    With a base what only one of them changed is merged first, the policy is left with the conflicts.
+    Any change left is one then, fail-on-conflict gives up on lines only one file has too.
+    Diffed by words or tokens (unit) the hunks are pieces of lines, and so are the conflicts.
+    """
+    if base:
+        from .merge3 import diff3_files
+        hunks, _, conflicts = diff3_files(base, file1, file2, algorithm, jobs)
+        merged = None if policy == 'fail-on-conflict' and conflicts else resolve(hunks, policy)
+    else:
+        if unit == 'lines':
+            hunks = diff_files(file1, file2, algorithm, jobs)
+        else:
+            from .tokens import diff_tokens
+            hunks = diff_tokens(file1, file2, unit, algorithm, jobs)
+        conflicts = sum(1 for hunk in hunks if hunk.kind is Kind.REPLACE and hunk.side == 'seq1')
+        merged = resolve(hunks, policy)
+    if merged is None:
+        print('mergepy: %d conflicts between %s and %s' % (conflicts, file1, file2), file=sys.stderr)
+        return 1
+
+    if output:
+        write(merged, output, file1, file2, base)
+    else:
+        sys.stdout.writelines(hunk.text() for hunk in merged)
+    return 0
+
+
+def write(hunks, output, *files) -> None:
+    """Writes the text of hunks to output, which may be one of the files they come from."""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    if overwrites(output, *files):
+        release(hunks)
+    write_atomic(output, (hunk.text() for hunk in hunks))
+
+
+def copy(source, output) -> None:
+    import shutil
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    shutil.copyfile(source, output)
+
+
+def auto_merge_pairs(queue, output, policy) -> int:
+    """auto_merge for every pair of a PairQueue, into the output directory if there is one.
+
+    A file only one tree has is taken as it is, if it's on the side the policy takes (both
+    takes either). fail-on-conflict can't tell a file added on one side from one deleted on
+    the other, so that's a conflict.
+    Prints how every pair went, the status is 1 if any of them had a conflict the policy gave up on.
+    """
+    status = 0
+    for pair in queue.pairs:
+        target = os.path.join(output, pair.name) if output else None
+        if pair.file1 is None or pair.file2 is None:
+            if policy == 'fail-on-conflict':
+                status = 1
+                print('%s: %s, conflict' % (pair.name, pair.status))
+                continue
+            source = pair.file1 if policy == 'left' else pair.file2 if policy == 'right' else pair.file1 or pair.file2
+            if source and target:
+                copy(source, target)
+        elif pair.future is not None:
+            hunks = queue.hunks(pair)
+            if hunks is None:
+                if target:
+                    copy(pair.file1, target)
+            else:
+                merged = resolve(hunks, policy)
+                if merged is None:
+                    status = 1
+                else:
+                    pair.merged = True
+                    if target:
+                        write(merged, target, pair.file1, pair.file2)
+                close(hunks)
+        print('%s: %s' % (pair.name, pair.status))
+    return status
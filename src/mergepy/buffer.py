@@ -0,0 +1,71 @@
+"""Line buffer behind the merged output."""
+
+from rich.cells import cell_len
+
+
+class MergeBuffer:
+    """The merged output as a list of lines.
+
+    Blocks only ever get added at the end (keep/replace) or taken off the end
+    again (undo), so next to the lines it keeps the widest line seen so far at
+    every line. That makes append and truncate O(1) per line, and height and
+    width O(1) whatever the size of the output.
+
+    Hunks of a word or token diff can be pieces of lines. Those are shown on a line
+    of their own like in the side views, so they're in self.lines with a newline
+    too, and self.pieces has the lines that don't have one in the output.
+    """
+
+    def __init__(self, *texts) -> None:
+        self.lines = []
+        self.widest = []
+        self.pieces = set()
+        self.append(*texts)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def __str__(self) -> str:
+        return ''.join(self.output())
+
+    @property
+    def height(self) -> int:
+        return len(self.lines)
+
+    @property
+    def width(self) -> int:
+        return self.widest[-1] if self.widest else 0
+
+    @staticmethod
+    def count(*texts) -> int:
+        """How many lines append adds for the texts."""
+        return sum(text.count('\n') + (not text.endswith('\n')) for text in texts if text)
+
+    def append(self, *texts) -> None:
+        """Adds the lines of every text, each text starts a line of its own."""
+        width = self.width
+        for text in texts:
+            # Only a newline ends a line, the same as in MappedLines and tokens.Rows
+            lines = text.split('\n')
+            if lines[-1]:
+                self.pieces.add(len(self.lines) + len(lines) - 1)
+            else:
+                lines.pop()
+            for line in lines:
+                width = max(width, cell_len(line.rstrip('\r')))
+                self.lines.append(line + '\n')
+                self.widest.append(width)
+
+    def truncate(self, count) -> None:
+        """Drops the last `count` lines."""
+        if count > 0:
+            del self.lines[-count:]
+            del self.widest[-count:]
+            if self.pieces:
+                self.pieces = {line for line in self.pieces if line < len(self.lines)}
+
+    def output(self) -> list:
+        """The lines as they go in the merged file."""
+        if not self.pieces:
+            return list(self.lines)
+        return [line[:-1] if i in self.pieces else line for i, line in enumerate(self.lines)]
@@ -0,0 +1,107 @@
+"""Cache of finished diffs on disk, so opening the same big pair again doesn't diff it again.
+
+An entry holds the matching blocks of one diff, on a hit the hunks are built straight
+from those (that's quick, the diff is what takes the time). Entries are keyed by the
+hashes of both files, the algorithm, the regions the diff was cut into and the VERSION of
+the engines, so a changed file or engine (or other cuts, which give other blocks) just
+misses. They live under $XDG_CACHE_HOME/mergepy (~/.cache/mergepy). A hit touches its
+entry, so the modification times say when each was last used, and once the entries take
+up more than MERGEPY_CACHE_SIZE megabytes (--cache-size, DEFAULT_SIZE without it, 0
+turns the cache off) the ones used longest ago go.
+"""
+
+import os
+from array import array
+
+from . import paths
+from .diff import VERSION
+from .paths import remove
+
+# Megabytes of entries kept when MERGEPY_CACHE_SIZE isn't set
+DEFAULT_SIZE = 64
+
+# Pairs with fewer lines than this (both files together) diff about as fast as an entry is read
+MIN_LINES = 5000
+
+
+def directory() -> str:
+    return paths.directory('XDG_CACHE_HOME', '.cache')
+
+
+def limit() -> int:
+    """Bytes the entries may take up, 0 when the cache is off."""
+    try:
+        return int(float(os.environ.get('MERGEPY_CACHE_SIZE', DEFAULT_SIZE)) * 1024 * 1024)
+    except ValueError:
+        return DEFAULT_SIZE * 1024 * 1024
+
+
+def entry(digest1, digest2, algorithm, regions) -> str:
+    import hashlib
+    key = hashlib.blake2b(digest1 + digest2 + ('%s %d %d' % (algorithm, regions, VERSION)).encode(), digest_size=16)
+    return os.path.join(directory(), key.hexdigest() + '.blocks')
+
+
+def load(digest1, digest2, algorithm, regions):
+    """The blocks of the diff of the files with these hashes, None on a miss."""
+    import zlib
+    path = entry(digest1, digest2, algorithm, regions)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # Every block is three 64 bit numbers, zlib'd
+    flat = array('q')
+    try:
+        flat.frombytes(zlib.decompress(data))
+    except (zlib.error, ValueError):
+        flat = None
+    if not flat or len(flat) % 3:
+        # Cut short or written by something else, it's of no use to anyone
+        remove(path)
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return list(zip(flat[0::3], flat[1::3], flat[2::3]))
+
+
+def store(digest1, digest2, algorithm, regions, blocks) -> None:
+    """Keeps the blocks of a diff, then drops the entries used longest ago if there's too much.
+
+    Nothing here is worth failing a diff over, a cache that can't be written is just left alone.
+    """
+    import zlib
+    size = limit()
+    if not size:
+        return
+    path = entry(digest1, digest2, algorithm, regions)
+    data = zlib.compress(array('q', [n for block in blocks for n in block]).tobytes(), 1)
+    # Written next to it and renamed, a pool process reading it never sees half an entry
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        os.makedirs(directory(), exist_ok=True)
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        evict(size)
+    except OSError:
+        remove(temporary)
+
+
+def evict(size) -> None:
+    """Removes the entries used longest ago until the rest takes up at most size bytes."""
+    entries = []
+    with os.scandir(directory()) as it:
+        for item in it:
+            if item.name.endswith('.blocks'):
+                stat = item.stat()
+                entries.append((stat.st_mtime, stat.st_size, item.path))
+    total = sum(length for _, length, _ in entries)
+    for _, length, path in sorted(entries):
+        if total <= size:
+            break
+        remove(path)
+        total -= length
@@ -0,0 +1,544 @@
+"""Line diff engines.
+
+Every engine takes two sequences of hashable items (usually lines) and returns
+a list of matching blocks ``(i, j, n)`` in the same format as
+``difflib.SequenceMatcher.get_matching_blocks()``, including the ``(len(a), len(b), 0)``
+sentinel at the end. ``opcodes()`` turns those into the familiar
+``(tag, i1, i2, j1, j2)`` tuples.
+"""
+
+import difflib
+import os
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import count
+
+from .trace import mark, span
+
+ALGORITHMS = ('myers', 'patience', 'histogram', 'difflib')
+
+# What's used when nothing else is asked for. Myers is exact but slow on big files with lots of changes,
+# histogram rescans the whole region for every split it makes and crawls on big files of unique lines
+DEFAULT_ALGORITHM = 'patience'
+
+# Bumped whenever an engine starts giving other blocks for the same input, diffs cached by older ones are ignored
+VERSION = 2
+
+# Edits myers looks through for a middle snake before it settles for the furthest it got (like git's and
+# diff-match-patch's limits), every step costs as much as the ones before it together so it's O(cost^2) per split
+MYERS_MIN_COST = 256
+
+# Lines that show up more often than this in a region are never used as split points by histogram diff
+HISTOGRAM_MAX_CHAIN = 64
+
+# Below this many lines (both files together) a process pool costs more than it saves
+PARALLEL_MIN_LINES = 20000
+
+# Segments handed out per worker, a few more than one keeps the pool busy when segments differ in cost
+SEGMENTS_PER_WORKER = 4
+
+# Changed characters (both lines together) up to which intraline() compares them exactly, and past which not at all
+INTRALINE_EXACT = 1000
+INTRALINE_MAX = 100000
+
+# Regions a big diff is cut into at least, run a region at a time the UI has something to show before it's all done
+STREAM_REGIONS = 16
+
+
+def _walk(a, b, split):
+    """Runs `split` over ever smaller unmatched regions and collects the matching blocks."""
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+
+        # Common prefix
+        start = alo
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            alo += 1
+            blo += 1
+        if alo > start:
+            blocks.append((start, blo - (alo - start), alo - start))
+
+        # Common suffix
+        end = ahi
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+        if end > ahi:
+            blocks.append((ahi, bhi, end - ahi))
+
+        if alo == ahi or blo == bhi:
+            continue
+        stack.extend(split(a, b, alo, ahi, blo, bhi, blocks))
+
+    blocks.sort()
+
+    # Glue adjacent blocks together so the result looks like what difflib returns
+    merged = []
+    for i, j, n in blocks:
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + n)
+        else:
+            merged.append((i, j, n))
+    merged.append((len(a), len(b), 0))
+    return merged
+
+
+def _myers_split(a, b, alo, ahi, blo, bhi, blocks):
+    """Finds the middle snake of the region (Myers 1986, linear space variant)."""
+    # Nothing in common at all, no need to look for a snake
+    if set(a[alo:ahi]).isdisjoint(b[blo:bhi]):
+        return []
+
+    n, m = ahi - alo, bhi - blo
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    length = 2 * max_d + 2
+    v1 = [-1] * length
+    v2 = [-1] * length
+    v1[offset + 1] = 0
+    v2[offset + 1] = 0
+    delta = n - m
+    # If the total number of characters is odd, the front path will collide with the reverse path
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    # Furthest point the front path got to, where the region gets cut once it's too much work
+    best_x = best_y = 0
+    max_cost = max(MYERS_MIN_COST, int((n + m) ** 0.5))
+    for d in range(max_d):
+        if d > max_cost:
+            if 0 < best_x + best_y < n + m:
+                return [(alo, alo + best_x, blo, blo + best_y), (alo + best_x, ahi, blo + best_y, bhi)]
+            return []
+        # Walk the front path one step
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 <= n and y1 <= m and x1 + y1 > best_x + best_y:
+                best_x, best_y = x1, y1
+            if x1 > n:
+                # Ran off the right of the graph
+                k1end += 2
+            elif y1 > m:
+                # Ran off the bottom of the graph
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < length and v2[k2_offset] != -1:
+                    # Mirror x2 onto top-left coordinate system
+                    if x1 >= n - v2[k2_offset]:
+                        return [(alo, alo + x1, blo, blo + y1), (alo + x1, ahi, blo + y1, bhi)]
+
+        # Walk the reverse path one step
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return [(alo, alo + x1, blo, blo + y1), (alo + x1, ahi, blo + y1, bhi)]
+
+    # No overlap found, the whole region is one big replace
+    return []
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Returns the (i, j) pairs of lines that occur exactly once on both sides, ordered by i."""
+    count_a = Counter(a[alo:ahi])
+    count_b = Counter(b[blo:bhi])
+    pos_b = {}
+    for j in range(blo, bhi):
+        if count_b[b[j]] == 1 and count_a[b[j]] == 1:
+            pos_b[b[j]] = j
+    return [(i, pos_b[a[i]]) for i in range(alo, ahi) if a[i] in pos_b]
+
+
+def _longest_increasing(pairs):
+    """Patience sorting: the longest run of pairs whose j is increasing along with i."""
+    if not pairs:
+        return []
+    tails, tail_js = [], []
+    backpointers = [None] * len(pairs)
+    for idx, (i, j) in enumerate(pairs):
+        pos = bisect_left(tail_js, j)
+        if pos > 0:
+            backpointers[idx] = tails[pos - 1]
+        if pos == len(tails):
+            tails.append(idx)
+            tail_js.append(j)
+        else:
+            tails[pos] = idx
+            tail_js[pos] = j
+    result = []
+    idx = tails[-1]
+    while idx is not None:
+        result.append(pairs[idx])
+        idx = backpointers[idx]
+    result.reverse()
+    return result
+
+
+def _patience_split(a, b, alo, ahi, blo, bhi, blocks):
+    """Splits the region at the unique lines both sides agree on (Bram Cohen's patience diff)."""
+    anchors = _longest_increasing(_unique_anchors(a, b, alo, ahi, blo, bhi))
+    if not anchors:
+        return _myers_split(a, b, alo, ahi, blo, bhi, blocks)
+
+    regions = []
+    for i, j in anchors:
+        blocks.append((i, j, 1))
+        regions.append((alo, i, blo, j))
+        alo, blo = i + 1, j + 1
+    regions.append((alo, ahi, blo, bhi))
+    return regions
+
+
+def _histogram_split(a, b, alo, ahi, blo, bhi, blocks):
+    """Splits the region at the longest common run around its least frequent line (like git's histogram diff)."""
+    occurrences = {}
+    for i in range(alo, ahi):
+        occurrences.setdefault(a[i], []).append(i)
+
+    best, best_count, best_skew = None, HISTOGRAM_MAX_CHAIN + 1, 0
+    j = blo
+    while j < bhi:
+        positions = occurrences.get(b[j])
+        next_j = j + 1
+        if positions and len(positions) <= best_count:
+            for i in positions:
+                # Grow the match in both directions
+                start_i, start_j = i, j
+                while start_i > alo and start_j > blo and a[start_i - 1] == b[start_j - 1]:
+                    start_i -= 1
+                    start_j -= 1
+                end_i, end_j = i + 1, j + 1
+                count = len(positions)
+                while end_i < ahi and end_j < bhi and a[end_i] == b[end_j]:
+                    count = min(count, len(occurrences.get(a[end_i], ())))
+                    end_i += 1
+                    end_j += 1
+                size = end_i - start_i
+                # Among equally long runs take the one closest to the middle, that keeps the recursion shallow
+                skew = abs((start_i - alo) - (ahi - end_i))
+                if best is None or count < best_count or (count == best_count and (size > best[2] or (size == best[2] and skew < best_skew))):
+                    best, best_count, best_skew = (start_i, start_j, size), count, skew
+                next_j = max(next_j, end_j)
+        j = next_j
+
+    if best is None:
+        # Only lines that are too common are shared, let myers sort it out
+        return _myers_split(a, b, alo, ahi, blo, bhi, blocks)
+
+    i, j, size = best
+    blocks.append(best)
+    return [(alo, i, blo, j), (i + size, ahi, j + size, bhi)]
+
+
+def myers(a, b):
+    return _walk(a, b, _myers_split)
+
+
+def patience(a, b):
+    return _walk(a, b, _patience_split)
+
+
+def histogram(a, b):
+    return _walk(a, b, _histogram_split)
+
+
+def sequencematcher(a, b):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).get_matching_blocks()
+
+
+ENGINES = {
+    'myers': myers,
+    'patience': patience,
+    'histogram': histogram,
+    'difflib': sequencematcher,
+}
+
+
+def _engine(algorithm):
+    try:
+        return ENGINES[algorithm]
+    except KeyError:
+        raise ValueError("Unknown diff algorithm '%s', choose from %s" % (algorithm, ', '.join(ALGORITHMS)))
+
+
+def _unique_ids(a, b):
+    """_unique_anchors over all of a and b, which are interned lines (ints from 0 up).
+
+    With lists indexed by line instead of Counters, it runs over whole files and a Counter
+    of every distinct line of a big file takes a lot more memory than the lines themselves.
+    """
+    size = max(max(a, default=-1), max(b, default=-1)) + 1
+    # Where a line is in a, -1 when it isn't and -2 when it's there more than once, same for b
+    where1 = [-1] * size
+    for i, line in enumerate(a):
+        where1[line] = i if where1[line] == -1 else -2
+    where2 = [-1] * size
+    for j, line in enumerate(b):
+        if where1[line] >= 0:
+            where2[line] = j if where2[line] == -1 else -2
+    return [(i, where2[line]) for i, line in enumerate(a) if where1[line] == i and where2[line] >= 0]
+
+
+def segments(a, b, count):
+    """Cuts a and b (interned) into at most `count` independent pieces at unique lines both sides share.
+
+    Returns a list of (alo, ahi, blo, bhi) regions that together cover both sequences.
+    Each cut starts a region with an anchor line, so diffing the regions separately and
+    putting the results back together gives a valid diff of the whole.
+    """
+    anchors = _longest_increasing(_unique_ids(a, b))
+    size = (len(a) + len(b)) // max(count, 1)
+    regions = []
+    alo = blo = 0
+    for i, j in anchors:
+        if len(regions) == count - 1:
+            break
+        if (i - alo) + (j - blo) >= size:
+            regions.append((alo, i, blo, j))
+            alo, blo = i, j
+    regions.append((alo, len(a), blo, len(b)))
+    return regions
+
+
+def _diff_segment(args):
+    a, b, algorithm = args
+    return _engine(algorithm)(a, b)
+
+
+def workers(jobs) -> int:
+    return jobs or os.cpu_count() or 1
+
+
+def region_blocks(a, b, regions, algorithm=DEFAULT_ALGORITHM, jobs=1):
+    """Diffs a and b a region of segments() at a time.
+
+    Yields every region with its matching blocks (offset into a and b, no sentinel) in
+    order, each as soon as it's done. Regions go to a pool of `jobs` processes unless that's 1.
+    """
+    _engine(algorithm)
+    work = [(a[alo:ahi], b[blo:bhi], algorithm) for alo, ahi, blo, bhi in regions]
+    if workers(jobs) == 1:
+        yield from _offset(regions, map(_diff_segment, work))
+        return
+    # concurrent.futures drags in multiprocessing and logging, only worth it when there's a pool to start
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers(jobs)) as executor:
+        yield from _offset(regions, executor.map(_diff_segment, work))
+
+
+def _offset(regions, results):
+    for region, result in zip(regions, results):
+        alo, ahi, blo, bhi = region
+        yield region, [(i + alo, j + blo, n) for i, j, n in result if n]
+
+
+def extend_blocks(blocks, more) -> None:
+    """Adds the blocks of the next region to blocks, joining a block that carries on from the last one."""
+    for i, j, n in more:
+        if blocks and blocks[-1][0] + blocks[-1][2] == i and blocks[-1][1] + blocks[-1][2] == j:
+            blocks[-1] = (blocks[-1][0], blocks[-1][1], blocks[-1][2] + n)
+        else:
+            blocks.append((i, j, n))
+
+
+def common_head(a, b, limit) -> int:
+    """How many items a and b start with in common, at most limit.
+
+    Compares slices, which runs in C, in chunks twice as long every time until one
+    differs and then bisects that chunk. That's O(n) and no Python loop over the items.
+    """
+    lo, step = 0, 64
+    while lo < limit:
+        hi = min(lo + step, limit)
+        if a[lo:hi] != b[lo:hi]:
+            break
+        lo = hi
+        step *= 2
+    else:
+        return limit
+    # a[lo:hi] and b[lo:hi] differ somewhere, everything before lo is the same
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def common_tail(a, b, limit) -> int:
+    """common_head from the other end."""
+    na, nb = len(a), len(b)
+    lo, step = 0, 64
+    while lo < limit:
+        hi = min(lo + step, limit)
+        if a[na - hi:na - lo] != b[nb - hi:nb - lo]:
+            break
+        lo = hi
+        step *= 2
+    else:
+        return limit
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[na - mid:na - lo] == b[nb - mid:nb - lo]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def intern(a, b) -> tuple:
+    """a and b with every distinct line swapped for an int, the engines compare and hash those a lot faster."""
+    # A line not seen yet gets the next number
+    ids = defaultdict(count().__next__)
+    return list(map(ids.__getitem__, a)), list(map(ids.__getitem__, b))
+
+
+def regions_for(jobs) -> int:
+    """Regions a big diff is cut into.
+
+    The same for every way in (the UI streaming it, --auto, --pairs, a three-way merge),
+    the cuts change what the hunks are so the same pair has to be cut the same way.
+    Without a pool they're diffed one after another, which is still a lot quicker than
+    running an engine over all of it at once.
+    """
+    return max(STREAM_REGIONS, workers(jobs) * SEGMENTS_PER_WORKER)
+
+
+def stream_blocks(a, b, algorithm=DEFAULT_ALGORITHM, jobs=1, count=1, interned=False):
+    """Diffs a and b, yielding (done, total, blocks) along the way.
+
+    The lines both start and end with are cut off first, and are a block each without
+    any diffing. What's left in the middle gets interned (unless it's numbers already,
+    interned) and diffed, in one go when it's small or count is 1, otherwise cut into
+    count regions with segments() that are diffed in order (in a pool of jobs processes).
+    blocks is the whole diff once done == total. Before that it's the diff up to the end
+    of the first region (the sentinel is put there) after the first region, and None
+    after the ones in between.
+    """
+    engine = _engine(algorithm)
+    limit = min(len(a), len(b))
+    with span('trim', lines=len(a) + len(b)):
+        head = common_head(a, b, limit)
+        tail = common_tail(a, b, limit - head)
+    alo, ahi, blo, bhi = head, len(a) - tail, head, len(b) - tail
+    blocks = [(0, 0, head)] if head else []
+    end = ([(ahi, bhi, tail)] if tail else []) + [(len(a), len(b), 0)]
+    if alo == ahi or blo == bhi:
+        # Identical, or lines only got added or only got taken out
+        yield 1, 1, blocks + end
+        return
+
+    if interned:
+        middle1, middle2 = a[alo:ahi], b[blo:bhi]
+    else:
+        with span('intern', lines=(ahi - alo) + (bhi - blo)):
+            middle1, middle2 = intern(a[alo:ahi], b[blo:bhi])
+    if count == 1 or len(middle1) + len(middle2) < PARALLEL_MIN_LINES:
+        with span('diff', algorithm=algorithm, lines=len(middle1) + len(middle2)):
+            more = engine(middle1, middle2)
+        extend_blocks(blocks, [(i + alo, j + blo, n) for i, j, n in more if n])
+        yield 1, 1, blocks + end
+        return
+
+    regions = segments(middle1, middle2, count)
+    total = len(regions)
+    for done, (region, more) in enumerate(region_blocks(middle1, middle2, regions, algorithm, jobs), 1):
+        extend_blocks(blocks, [(i + alo, j + blo, n) for i, j, n in more])
+        mark('region diffed', done=done, total=total)
+        if done == total:
+            break
+        if done == 1:
+            # Ends the diff where the region ends, the common block there may still carry on into the next one
+            yield done, total, blocks + [(region[1] + alo, region[3] + blo, 0)]
+        else:
+            yield done, total, None
+    yield total, total, blocks + end
+
+
+def matching_blocks(a, b, algorithm=DEFAULT_ALGORITHM, jobs=1):
+    """Diffs a and b, spreading the work over `jobs` processes for big inputs (0 means one per cpu)."""
+    for done, total, blocks in stream_blocks(a, b, algorithm, jobs, regions_for(jobs)):
+        pass
+    return blocks
+
+
+def opcodes(blocks):
+    """Same as difflib.SequenceMatcher.get_opcodes() but for any list of matching blocks."""
+    codes = []
+    i = j = 0
+    for ai, bj, size in blocks:
+        if i < ai and j < bj:
+            codes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            codes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            codes.append(('insert', i, ai, j, bj))
+        if size:
+            codes.append(('equal', ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return codes
+
+
+def intraline(text1, text2):
+    """Character ranges that differ between two replaced blocks, paired up line by line.
+
+    Returns two lists (one per side) of (line offset, start column, end column).
+    """
+    ranges1, ranges2 = [], []
+    # Only a newline ends a line, the same as in the side views
+    lines1 = (text1[:-1] if text1.endswith('\n') else text1).split('\n')
+    lines2 = (text2[:-1] if text2.endswith('\n') else text2).split('\n')
+    for offset, (line1, line2) in enumerate(zip(lines1, lines2)):
+        head = 0
+        middle1, middle2 = line1, line2
+        if len(line1) + len(line2) > INTRALINE_EXACT:
+            # Only what's between the start and end both lines share gets compared, that's the
+            # one changed value of a long minified line, and it's found without any Python loop
+            limit = min(len(line1), len(line2))
+            head = common_head(line1, line2, limit)
+            tail = common_tail(line1, line2, limit - head)
+            middle1, middle2 = line1[head:len(line1) - tail], line2[head:len(line2) - tail]
+        length = len(middle1) + len(middle2)
+        if length > INTRALINE_MAX:
+            # Too much to compare on the UI thread, the middle is just all changed
+            codes = [('replace', 0, len(middle1), 0, len(middle2))]
+        else:
+            # SequenceMatcher is quadratic without autojunk, with it the result is rougher but it keeps up
+            codes = difflib.SequenceMatcher(None, middle1, middle2, autojunk=length > INTRALINE_EXACT).get_opcodes()
+        for tag, i1, i2, j1, j2 in codes:
+            if tag == 'equal':
+                continue
+            if i1 < i2:
+                ranges1.append((offset, head + i1, head + i2))
+            if j1 < j2:
+                ranges2.append((offset, head + j1, head + j2))
+    return ranges1, ranges2
@@ -0,0 +1,157 @@
+"""Syntax highlighting that only lexes a side text once."""
+
+from rich.syntax import Syntax, NUMBERS_COLUMN_DEFAULT_PADDING
+from rich.text import Span, Text
+
+from .loader import split_lines
+
+
+class HighlightCache:
+    """Highlighted lines of one side text, per theme.
+
+    The text itself never changes, so the only thing that makes it lex again
+    is asking for a theme it hasn't seen yet.
+    """
+
+    def __init__(self, text, lang) -> None:
+        self.text = text
+        self.lang = lang
+        # The same lines as the lexed ones, which only a newline ends
+        self.source = split_lines(text)
+        # Numbers column as wide as it would be for the whole file, so every slice lines up
+        self.number_width = len(str(1 + text.count('\n'))) + NUMBERS_COLUMN_DEFAULT_PADDING
+        self.themes = {}
+
+    def lex(self, theme) -> None:
+        if theme in self.themes:
+            return
+        syntax = Syntax(self.text, self.lang, theme=theme)
+        code = self.text if self.text.endswith('\n') else self.text + '\n'
+        self.themes[theme] = syntax.highlight(code.expandtabs(syntax.tab_size)).split('\n', allow_blank=True)
+
+    def lines(self, theme, start, end):
+        """Highlighted lines [start, end), None until the theme has been lexed."""
+        lines = self.themes.get(theme)
+        return lines[start:end] if lines is not None else None
+
+
+def crop(line, start, end) -> Text:
+    """Characters [start, end) of a highlighted line.
+
+    The spans of a lexed line are its tokens, in order and not overlapping, so the first one
+    in there is a bisect away and the rest of the line isn't looked at. Slicing the Text
+    would go through every span of it.
+    """
+    if start == 0 and len(line) <= end:
+        return line
+    spans = line.spans
+    lo, hi = 0, len(spans)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if spans[mid].end <= start:
+            lo = mid + 1
+        else:
+            hi = mid
+    cropped = line.blank_copy(line.plain[start:end])
+    for span in spans[lo:]:
+        if span.start >= end:
+            break
+        cropped.spans.append(Span(max(span.start, start) - start, min(span.end, end) - start, span.style))
+    return cropped
+
+
+class SliceSyntax(Syntax):
+    """Syntax for lines [start, end) of a side text, with the highlighting taken from a HighlightCache.
+
+    Until the cache has lexed the theme, only the slice's own lines are lexed. With columns
+    (start, end) only those columns of the code are there, what's left of them is cut off
+    and so is what's right of them, so a line of a megabyte costs what's on screen.
+    """
+
+    def __init__(self, cache, start, end, theme, columns=None, **kwargs) -> None:
+        lines = cache.source[start:end]
+        if columns is not None:
+            lines = [line[columns[0]:columns[1]].rstrip('\n') + '\n' for line in lines]
+        code = ''.join(lines)
+        # A trailing newline would show up as an extra blank line
+        if code.endswith('\n'):
+            code = code[:-1]
+        super().__init__(code, cache.lang, theme=theme, start_line=start + 1, **kwargs)
+        self.cache = cache
+        self.start = start
+        self.end = end
+        self.theme_name = theme
+        self.columns = columns
+
+    @property
+    def _numbers_column_width(self) -> int:
+        return self.cache.number_width if self.line_numbers else 0
+
+    def highlight(self, code, line_range=None) -> Text:
+        lines = self.cache.lines(self.theme_name, self.start, self.end)
+        if lines is None:
+            return super().highlight(code, line_range)
+
+        base_style = self._get_base_style()
+        text = Text(
+            justify='default' if base_style.transparent_background else 'left',
+            style=base_style,
+            tab_size=self.tab_size,
+            no_wrap=not self.word_wrap,
+        )
+        for line in lines:
+            if self.columns is not None:
+                line = crop(line, *self.columns)
+            text.append_text(line)
+            text.append('\n')
+        if self._stylized_ranges:
+            self._apply_stylized_ranges(text)
+        return text
+
+
+class TailHighlightCache:
+    """Highlighted lines of the merged output, which only ever changes at the end.
+
+    Lines are lexed on demand, from where the highlighted lines stop up to the last line
+    asked for. Lexing picks up CONTEXT lines early so it doesn't start in the middle of
+    a string or comment, and a change to the end only throws away the lines after it.
+    Has the same lang/source/number_width/lines() as HighlightCache so SliceSyntax can draw from it.
+    """
+
+    CONTEXT = 100
+
+    def __init__(self, buffer, lang) -> None:
+        self.buffer = buffer
+        self.lang = lang
+        self.themes = {}
+
+    @property
+    def source(self) -> list:
+        return self.buffer.lines
+
+    @property
+    def number_width(self) -> int:
+        return len(str(len(self.buffer))) + NUMBERS_COLUMN_DEFAULT_PADDING
+
+    def truncate(self, line) -> None:
+        """Forgets the highlighting from `line` on."""
+        for lines in self.themes.values():
+            del lines[line:]
+
+    def lex(self, theme, start, end) -> list:
+        """Highlighted lines [start, end), lexed from CONTEXT lines before start."""
+        lead = max(0, start - self.CONTEXT)
+        code = ''.join(self.buffer.lines[lead:end])
+        syntax = Syntax(code, self.lang, theme=theme)
+        return syntax.highlight(code.expandtabs(syntax.tab_size)).split('\n', allow_blank=True)[start - lead:end - lead]
+
+    def lines(self, theme, start, end):
+        end = min(end, len(self.buffer))
+        lines = self.themes.setdefault(theme, [])
+        if len(lines) < end:
+            if start - len(lines) > self.CONTEXT:
+                # Far past the highlighted lines (a batch of hunks just went in and the view jumped to the
+                # end), these are lexed on their own instead of everything before them
+                return self.lex(theme, start, end)
+            lines += self.lex(theme, len(lines), end)
+        return lines[start:end]
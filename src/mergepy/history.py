@@ -0,0 +1,57 @@
+"""Undo/redo log of a merge session."""
+
+from collections import deque
+
+
+class Step:
+    """One keep/replace/delete (or a batch of them), with the hunks it resolved on both sides.
+
+    Only the hunk ids are kept, plus where the merged output was when it ran and
+    how many lines it added there, so undoing it is just cutting the output back.
+    """
+
+    __slots__ = ('action', 'ids', 'offset', 'length', 'texts')
+
+    def __init__(self, action, ids, offset, length, texts=None) -> None:
+        self.action = action
+        # The hunks whose text went into the output, in that order, then the ones resolved along without it
+        # (the peer, for a single step)
+        self.ids = ids
+        self.offset = offset
+        self.length = length
+        # How many of the ids went into the output, a single step has just the first one when it added anything
+        self.texts = (1 if length else 0) if texts is None else texts
+
+    def __repr__(self) -> str:
+        return 'Step(%s, %s, %d+%d)' % (self.action, ', '.join(self.ids), self.offset, self.length)
+
+
+class History:
+    """Steps that can be undone and redone, both ends are O(1).
+
+    With a depth the oldest steps are dropped once there are more than that.
+    """
+
+    def __init__(self, depth=None) -> None:
+        self.done = deque(maxlen=depth or None)
+        self.undone = []
+
+    def record(self, step) -> None:
+        self.done.append(step)
+        self.undone.clear()
+
+    def can_undo(self) -> bool:
+        return len(self.done) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.undone) > 0
+
+    def undo(self) -> Step:
+        step = self.done.pop()
+        self.undone.append(step)
+        return step
+
+    def redo(self) -> Step:
+        step = self.undone.pop()
+        self.done.append(step)
+        return step
@@ -0,0 +1,248 @@
+"""Hunk model shared by the diff and the views.
+
+Each file is split into lines once, those lines are kept in a tuple (the line table)
+and every hunk just points into it with a start and end offset.
+"""
+
+import itertools
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from enum import Enum
+
+from . import cache
+from .diff import DEFAULT_ALGORITHM, matching_blocks, opcodes, regions_for, stream_blocks
+from .loader import MappedLines, split_lines
+from .trace import span
+
+
+class Kind(Enum):
+    COMMON = 'common'
+    REPLACE = 'replace'
+    # Only in the first file
+    DELETE = 'min'
+    # Only in the second file
+    INSERT = 'plus'
+
+
+# What every line of a hunk is prefixed with in the side views
+MARKERS = {'seq1': '- ', 'seq2': '+ '}
+
+
+class Hunk:
+    """A run of lines [start, end) from one file."""
+
+    __slots__ = ('side', 'kind', 'number', 'start', 'end', 'lines', 'peer')
+
+    def __init__(self, side, kind, number, start, end, lines, peer=None) -> None:
+        self.side = side
+        self.kind = kind
+        self.number = number
+        self.start = start
+        self.end = end
+        self.lines = lines
+        self.peer = peer
+
+    def __repr__(self) -> str:
+        return 'Hunk(%s, %d-%d)' % (self.id, self.start, self.end)
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def id(self) -> str:
+        # Inserts and deletes only exist on one side, so their id has no side in it
+        if self.kind is Kind.COMMON or self.kind is Kind.REPLACE:
+            return '%s_%s%d' % (self.side, self.kind.value, self.number)
+        return '%s%d' % (self.kind.value, self.number)
+
+    @property
+    def linerange(self) -> tuple:
+        """1-based, inclusive line range in the side view, what rich's Syntax wants."""
+        return (self.start + 1, self.end)
+
+    @property
+    def marker(self) -> str:
+        return '  ' if self.kind is Kind.COMMON else MARKERS[self.side]
+
+    def marked(self) -> str:
+        """The lines as they're shown in the side view."""
+        marker = self.marker
+        return ''.join(marker + line for line in self.lines[self.start:self.end])
+
+    def text(self) -> str:
+        """The lines as they end up in the merged file."""
+        if hasattr(self.lines, 'text'):
+            # Rows of a token diff (tokens.Rows) are pieces of lines, only the table knows where the lines end
+            return self.lines.text(self.start, self.end)
+        return ''.join(line.rstrip('\r\n') + '\n' for line in self.lines[self.start:self.end])
+
+
+class HunkIndex:
+    """The hunks of one side in the order they're shown, by slot and by id.
+
+    Next to that it keeps the slots of the unresolved replace hunks (the conflicts)
+    sorted, so the next or previous conflict is a bisect away.
+    """
+
+    def __init__(self, hunks) -> None:
+        self.hunks = list(hunks)
+        self.slots = {hunk: slot for slot, hunk in enumerate(self.hunks)}
+        self.ids = {hunk.id: hunk for hunk in self.hunks}
+        self.conflicts = [slot for slot, hunk in enumerate(self.hunks) if hunk.kind is Kind.REPLACE]
+
+    def __len__(self) -> int:
+        return len(self.hunks)
+
+    def __getitem__(self, slot) -> Hunk:
+        return self.hunks[slot]
+
+    def resolve(self, hunk) -> None:
+        if hunk.kind is Kind.REPLACE:
+            slot = self.slots[hunk]
+            i = bisect_left(self.conflicts, slot)
+            if i < len(self.conflicts) and self.conflicts[i] == slot:
+                del self.conflicts[i]
+
+    def restore(self, hunk) -> None:
+        if hunk.kind is Kind.REPLACE:
+            slot = self.slots[hunk]
+            i = bisect_left(self.conflicts, slot)
+            if i == len(self.conflicts) or self.conflicts[i] != slot:
+                insort(self.conflicts, slot)
+
+    def next_conflict(self, slot, step=1):
+        """First unresolved replace hunk after (or before, with step=-1) slot."""
+        if step > 0:
+            i = bisect_right(self.conflicts, slot)
+            return self.hunks[self.conflicts[i]] if i < len(self.conflicts) else None
+        i = bisect_left(self.conflicts, slot) - 1
+        return self.hunks[self.conflicts[i]] if i >= 0 else None
+
+
+def build_hunks(lines1, lines2, blocks) -> list:
+    """Turns matching blocks into hunks, in the order they appear in the diff.
+
+    The last removed line of a replaced block is paired up with the first added line
+    as a replace hunk, whatever is left over above and below becomes a delete
+    ('minN') or insert ('plusN') hunk.
+    """
+    with span('build hunks', blocks=len(blocks)):
+        return _build_hunks(lines1, lines2, blocks)
+
+
+def _build_hunks(lines1, lines2, blocks) -> list:
+    hunks = []
+    rep, plus, min, com = 0, 0, 0, 0
+    for tag, i1, i2, j1, j2 in opcodes(blocks):
+        if tag == 'equal':
+            common1 = Hunk('seq1', Kind.COMMON, com, i1, i2, lines1)
+            common2 = Hunk('seq2', Kind.COMMON, com, j1, j2, lines2, common1)
+            common1.peer = common2
+            hunks += [common1, common2]
+            com += 1
+            continue
+
+        if tag == 'replace' and i2 - i1 > 1:
+            hunks.append(Hunk('seq1', Kind.DELETE, min, i1, i2 - 1, lines1))
+            min += 1
+        elif tag == 'delete':
+            hunks.append(Hunk('seq1', Kind.DELETE, min, i1, i2, lines1))
+            min += 1
+
+        if tag == 'replace':
+            replace1 = Hunk('seq1', Kind.REPLACE, rep, i2 - 1, i2, lines1)
+            replace2 = Hunk('seq2', Kind.REPLACE, rep, j1, j1 + 1, lines2, replace1)
+            replace1.peer = replace2
+            hunks += [replace1, replace2]
+            rep += 1
+            j1 += 1
+
+        if j1 < j2:
+            hunks.append(Hunk('seq2', Kind.INSERT, plus, j1, j2, lines2))
+            plus += 1
+    return hunks
+
+
+def diff_hunks(text1, text2, algorithm=DEFAULT_ALGORITHM, jobs=1) -> list:
+    """Diffs two texts line by line straight into hunks."""
+    # Line tables, every hunk points into these instead of holding its own copy of the lines
+    with span('split lines'):
+        lines1 = tuple(split_lines(text1))
+        lines2 = lines1 if text2 == text1 else tuple(split_lines(text2))
+    return build_hunks(lines1, lines2, matching_blocks(lines1, lines2, algorithm, jobs))
+
+
+def diff_files(path1, path2, algorithm=DEFAULT_ALGORITHM, jobs=1) -> list:
+    """diff_hunks straight from two files, which only get decoded where a hunk's lines are used."""
+    lines1, lines2 = read_files(path1, path2)
+    for done, total, blocks in file_blocks(lines1, lines2, algorithm, jobs, regions_for(jobs)):
+        pass
+    return build_hunks(lines1, lines2, blocks)
+
+
+def read_files(path1, path2) -> tuple:
+    with span('read', bytes=os.path.getsize(path1) + os.path.getsize(path2)):
+        return MappedLines(path1), MappedLines(path2)
+
+
+def overwrites(path, *files) -> bool:
+    """Whether saving to path replaces one of files (None for no file)."""
+    return os.path.exists(path) and any(file and os.path.exists(file) and os.path.samefile(path, file) for file in files)
+
+
+def release(hunks) -> None:
+    """Reads every file the hunks point into into memory and unmaps it, before a save replaces one of them."""
+    with span('release'):
+        for lines in {id(hunk.lines): hunk.lines for hunk in hunks}.values():
+            # Tables of texts (diff_hunks) and of token rows aren't mapped
+            if hasattr(lines, 'release'):
+                lines.release()
+
+
+def close(hunks) -> None:
+    """Unmaps every file the hunks point into, once nothing is going to read them any more."""
+    for lines in {id(hunk.lines): hunk.lines for hunk in hunks}.values():
+        if hasattr(lines, 'close'):
+            lines.close()
+
+
+def file_blocks(lines1, lines2, algorithm, jobs, count):
+    """stream_blocks over two mapped files.
+
+    The same file twice (same size, same hash) is one block without even splitting it
+    into lines, and a big pair diffed before comes out of the cache in one go. Otherwise
+    the diff runs on the lines as numbers (MappedLines.keys()), and what it gives goes into the cache.
+    """
+    if lines1.size == lines2.size and lines1.digest() == lines2.digest():
+        yield 1, 1, [(0, 0, len(lines1)), (len(lines1), len(lines2), 0)]
+        return
+    cached = len(lines1) + len(lines2) >= cache.MIN_LINES and cache.limit()
+    if cached:
+        with span('cache'):
+            blocks = cache.load(lines1.digest(), lines2.digest(), algorithm, count)
+        if blocks is not None:
+            yield 1, 1, blocks
+            return
+    with span('intern', lines=len(lines1) + len(lines2)):
+        # Every distinct line as a number, the same one in both files
+        ids = defaultdict(itertools.count().__next__)
+        keys1, keys2 = lines1.keys(ids), lines2.keys(ids)
+        del ids
+    for done, total, blocks in stream_blocks(keys1, keys2, algorithm, jobs, count, interned=True):
+        if cached and done == total:
+            with span('cache'):
+                cache.store(lines1.digest(), lines2.digest(), algorithm, count, blocks)
+        yield done, total, blocks
+
+
+def stream_hunks(path1, path2, algorithm=DEFAULT_ALGORITHM, jobs=1):
+    """diff_files, a region at a time for big files so there's something to show early.
+
+    Yields (done, total, hunks) after every region. hunks covers the regions done so far
+    after the first one, is None after the ones in between and is the whole diff after
+    the last. Small diffs are done in one go, which is a single (1, 1, hunks).
+    """
+    lines1, lines2 = read_files(path1, path2)
+    for done, total, blocks in file_blocks(lines1, lines2, algorithm, jobs, regions_for(jobs)):
+        yield done, total, None if blocks is None else build_hunks(lines1, lines2, blocks)
@@ -0,0 +1,201 @@
+"""Journal of a merge session, so a crash (or quitting without saving) doesn't lose what got resolved.
+
+There's one journal per pair of files (and base, for a three-way merge), a JSON lines
+file under $XDG_STATE_HOME/mergepy (~/.local/state/mergepy). The first line has the
+hashes of the files and the hunks of the diff, every line after it is a keep/replace/
+delete step, an undo or a redo, appended as it happens. Opening the same files again,
+unchanged, replays it: the hunks come out of the journal instead of a new diff, and the
+steps are run against a History and a list of what's in the output, without any of the
+UI. A three-way merge's hunks point into lines put together from all three files, and
+those of a word or token diff into rows cut out of them, so those are diffed again
+instead and have to come out the same as the journal's.
+"""
+
+import json
+import os
+
+from . import paths
+from .diff import DEFAULT_ALGORITHM
+from .history import History, Step
+from .hunks import Hunk, Kind
+from .loader import MappedLines, digest
+from .paths import remove
+
+# Bumped whenever what's in a journal changes, older ones are just ignored
+VERSION = 1
+
+
+def directory() -> str:
+    return paths.directory('XDG_STATE_HOME', '.local', 'state')
+
+
+def dump_hunks(hunks) -> list:
+    slots = {hunk: slot for slot, hunk in enumerate(hunks)}
+    return [[hunk.side, hunk.kind.value, hunk.number, hunk.start, hunk.end, slots[hunk.peer] if hunk.peer else -1]
+            for hunk in hunks]
+
+
+def load_hunks(rows, lines1, lines2) -> list:
+    hunks = [Hunk(side, Kind(kind), number, start, end, lines1 if side == 'seq1' else lines2)
+             for side, kind, number, start, end, peer in rows]
+    for hunk, row in zip(hunks, rows):
+        if row[5] >= 0:
+            hunk.peer = hunks[row[5]]
+    return hunks
+
+
+class Session:
+    """Where a replayed journal left the merge: the hunks, which of them are resolved, the output and the history."""
+
+    def __init__(self, hunks, depth=None) -> None:
+        self.hunks = hunks
+        self.ids = {hunk.id: hunk for hunk in hunks}
+        self.history = History(depth)
+        self.resolved = set()
+        # Hunks whose text is in the output, in order
+        self.output = []
+        self.steps = 0
+
+    def apply(self, entry) -> None:
+        """Does what the app did for one journal entry."""
+        if entry[0] == 'undo':
+            step = self.history.undo()
+            # Steps come off in the order they went on, so its texts are the last ones
+            del self.output[len(self.output) - step.texts:]
+            self.resolved.difference_update(self.ids[id] for id in step.ids)
+        else:
+            if entry[0] == 'redo':
+                step = self.history.redo()
+            else:
+                step = Step(entry[0], tuple(entry[1]), *entry[2:5])
+                self.history.record(step)
+            self.resolved.update(self.ids[id] for id in step.ids)
+            self.output += [self.ids[id] for id in step.ids[:step.texts]]
+        self.steps += 1
+
+    def texts(self) -> list:
+        """Text of every hunk in the output, in order."""
+        return [hunk.text() for hunk in self.output]
+
+
+class Journal:
+    """The journal of merging file1 and file2, against base if there is one, diffed by unit (see tokens.UNITS).
+
+    Nothing is written before start() (a new session) or replay() (picking up an old one).
+    """
+
+    def __init__(self, file1, file2, base=None, unit='lines') -> None:
+        self.file1 = os.path.abspath(file1)
+        self.file2 = os.path.abspath(file2)
+        self.base = os.path.abspath(base) if base else None
+        self.files = [self.file1, self.file2] + ([self.base] if base else [])
+        self.unit = unit
+        # A word or token diff of the same files is a session of its own
+        key = digest_text('\0'.join(self.files + ([] if unit == 'lines' else [unit])))
+        self.path = os.path.join(directory(), key + '.jsonl')
+        self.file = None
+        # Entries written, and how many of them a save has covered
+        self.entries = 0
+        self.saved_at = None
+
+    def start(self, hunks) -> None:
+        """Begins a new journal for the diff in hunks, replacing any old one."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.close()
+        header = {'version': VERSION, 'files': self.files, 'unit': self.unit,
+                  'digests': [digest(file).hex() for file in self.files], 'hunks': dump_hunks(hunks)}
+        self.file = open(self.path, 'w')
+        self.file.write(json.dumps(header) + '\n')
+        self.file.flush()
+        self.entries = 0
+        self.saved_at = None
+
+    def replay(self, depth=None, algorithm=DEFAULT_ALGORITHM, jobs=1):
+        """The Session an earlier journal of these same files ends in, None when there's none to pick up.
+
+        Journaling carries on at the end of it. A last line cut short by a crash is dropped.
+        The algorithm and jobs are only needed to merge against a base or diff by words or tokens again.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return None
+        with f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return None
+            if header.get('version') != VERSION or header.get('files') != self.files or header.get('unit', 'lines') != self.unit:
+                return None
+            if header['digests'] != [digest(file).hex() for file in self.files]:
+                # One of the files changed since
+                return None
+            end = f.tell()
+            if not f.readline().endswith(b'\n'):
+                # Quit before doing anything, there's nothing to pick up (and no need to diff again to find out)
+                remove(self.path)
+                return None
+            f.seek(end)
+            if self.base:
+                from .merge3 import diff3_files
+                hunks = diff3_files(self.base, self.file1, self.file2, algorithm, jobs)[0]
+                if dump_hunks(hunks) != header['hunks']:
+                    return None
+            elif self.unit != 'lines':
+                from .tokens import diff_tokens
+                hunks = diff_tokens(self.file1, self.file2, self.unit, algorithm, jobs)
+                if dump_hunks(hunks) != header['hunks']:
+                    return None
+            else:
+                hunks = load_hunks(header['hunks'], MappedLines(self.file1), MappedLines(self.file2))
+            session = Session(hunks, depth)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('cut short')
+                    session.apply(json.loads(line))
+                except (ValueError, KeyError, IndexError, TypeError):
+                    break
+                end += len(line)
+        if not session.steps:
+            remove(self.path)
+            return None
+        with open(self.path, 'r+b') as f:
+            f.truncate(end)
+        self.file = open(self.path, 'a')
+        self.entries = session.steps
+        return session
+
+    def write(self, entry) -> None:
+        if self.file is not None:
+            self.file.write(json.dumps(entry) + '\n')
+            # Flushed so it's with the OS when the app dies, not synced, a sync for every keypress is too slow
+            self.file.flush()
+            self.entries += 1
+
+    def record(self, step) -> None:
+        self.write([step.action, list(step.ids), step.offset, step.length, step.texts])
+
+    def undo(self) -> None:
+        self.write(['undo'])
+
+    def redo(self) -> None:
+        self.write(['redo'])
+
+    def saved(self, entries) -> None:
+        """A save went through with what the first `entries` entries made of the output."""
+        self.saved_at = entries
+
+    def close(self) -> None:
+        """Stops journaling, the journal goes when everything in it got saved or there's nothing in it."""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if self.saved_at == self.entries or not self.entries:
+            remove(self.path)
+
+
+def digest_text(text) -> str:
+    import hashlib
+    return hashlib.blake2b(text.encode('utf-8', 'surrogateescape'), digest_size=16).hexdigest()
@@ -0,0 +1,158 @@
+"""Files as a sequence of lines, straight off a memory map.
+
+Nothing gets read into memory up front: the file is mapped, an index of where every
+line starts is built over the bytes, and a line is only decoded when it's asked for.
+The map stays for the whole session, only a save over the file itself reads it in (release()).
+"""
+
+import mmap
+from array import array
+from itertools import accumulate
+
+# Bytes looked at per go while indexing
+CHUNK = 1 << 22
+
+
+def digest(path) -> bytes:
+    """blake2b of a file, read a MB at a time. The same as MappedLines.digest() for that file."""
+    import hashlib
+    hash = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hash.update(chunk)
+    return hash.digest()
+
+
+def chunks(data):
+    """Pieces of data of about CHUNK bytes that start and end on a line boundary, with where they start."""
+    size = len(data)
+    start = 0
+    while start < size:
+        end = data.rfind(b'\n', start, start + CHUNK) + 1
+        if end <= start:
+            # No newline in a whole chunk, so it's either the last line or a very long one
+            end = data.find(b'\n', start) + 1 or size
+        yield start, data[start:end]
+        start = end
+
+
+def split(region) -> list:
+    """Lines of a region with their \n, a lone \r doesn't end a line."""
+    if b'\r' not in region:
+        return region.splitlines(keepends=True)
+    lines = [line + b'\n' for line in region.split(b'\n')]
+    last = lines.pop()
+    if len(last) > 1:
+        lines.append(last[:-1])
+    return lines
+
+
+def split_lines(text) -> list:
+    """Lines of a text with their \n like MappedLines has them, not \\f, \\x85, \\u2028 or what else str.splitlines ends a line at."""
+    lines = [line + '\n' for line in text.split('\n')]
+    last = lines.pop()
+    if len(last) > 1:
+        lines.append(last[:-1])
+    return lines
+
+
+def index_lines(data) -> array:
+    """Offsets of the start of every line in data, plus the end of the data."""
+    offsets = array('q')
+    for start, region in chunks(data):
+        offsets.extend(accumulate(map(len, split(region)), initial=start))
+        # That's where the next region starts
+        offsets.pop()
+    offsets.append(len(data))
+    return offsets
+
+
+class MappedLines:
+    """The lines of a file, with their line endings, decoded on access.
+
+    Indexing and slicing give str lines like text.splitlines(keepends=True) would, with
+    \\r\\n turned into \\n the way reading a file in text mode does. keys() gives every
+    line as a number for diffing, which never decodes anything.
+    """
+
+    def __init__(self, path, encoding='utf-8') -> None:
+        self.path = path
+        self.encoding = encoding
+        self.map = self.open(path)
+        self.offsets = index_lines(self.map)
+        self.hash = None
+
+    @staticmethod
+    def open(path):
+        with open(path, 'rb') as f:
+            # mmap can't map an empty file
+            if f.seek(0, 2) == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getstate__(self) -> dict:
+        # Goes through pickle when a pool diffed it, the other side maps the file again
+        return {'path': self.path, 'encoding': self.encoding, 'offsets': self.offsets, 'hash': self.hash}
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.map = self.open(self.path)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def size(self) -> int:
+        return len(self.map)
+
+    def digest(self) -> bytes:
+        """blake2b of the whole file, straight off the map. Worked out once."""
+        if self.hash is None:
+            import hashlib
+            self.hash = hashlib.blake2b(self.map).digest()
+        return self.hash
+
+    def raw(self, i) -> bytes:
+        line = self.map[self.offsets[i]:self.offsets[i + 1]]
+        return line[:-2] + b'\n' if line.endswith(b'\r\n') else line
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.raw(j).decode(self.encoding) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode(self.encoding)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.raw(i).decode(self.encoding)
+
+    def keys(self, ids) -> list:
+        """Every line as its number in ids, what the diff compares.
+
+        ids is a defaultdict that hands out the next number for a line it hasn't seen, shared
+        by both files. The lines are taken off the map a chunk at a time, so only the distinct
+        ones are ever kept as bytes (in ids) and never a list of all of them.
+        """
+        keys = []
+        for start, region in chunks(self.map):
+            keys += map(ids.__getitem__, split(region.replace(b'\r\n', b'\n') if b'\r\n' in region else region))
+        return keys
+
+    def release(self) -> None:
+        """Reads the file into memory and unmaps it, before a save replaces the file.
+
+        Windows won't replace a mapped file, and the lines have to stay what they were
+        after it's replaced. They work the same after, it's just the whole file in memory.
+        """
+        if isinstance(self.map, mmap.mmap):
+            data = self.map[:]
+            self.map.close()
+            self.map = data
+
+    def close(self) -> None:
+        """Unmaps the file for good, once nothing is going to read these lines any more."""
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
@@ -0,0 +1,161 @@
+"""Three-way merge against a common base, diff3 style.
+
+Both files are diffed against the base and the two lists of changes are walked side by
+side once. Where only one file changed something that change is taken, where both made
+the same change it's taken once, and only where they changed overlapping (or touching)
+lines differently there's a conflict. The result is put in the shape of a 2-way diff:
+every merged stretch becomes common lines of both sides, the conflicts become the
+changes between them, so the views only have the conflicts to resolve.
+"""
+
+from bisect import bisect_right
+
+from .diff import DEFAULT_ALGORITHM, regions_for
+from .hunks import build_hunks, file_blocks, read_files
+from .loader import MappedLines
+from .trace import span
+
+
+class Spliced:
+    """Line table made of runs of lines of other tables (MappedLines), indexed like one of them."""
+
+    def __init__(self) -> None:
+        # Where every run starts in this table, and the (lines, start, end) it's taken from
+        self.starts = []
+        self.runs = []
+        self.length = 0
+
+    def add(self, lines, start, end) -> None:
+        if end > start:
+            self.starts.append(self.length)
+            self.runs.append((lines, start, end))
+            self.length += end - start
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, _ = i.indices(self.length)
+            result = []
+            run = bisect_right(self.starts, start) - 1
+            while start < stop:
+                lines, lo, hi = self.runs[run]
+                offset = start - self.starts[run]
+                take = min(hi - lo - offset, stop - start)
+                result += lines[lo + offset:lo + offset + take]
+                start += take
+                run += 1
+            return result
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError(i)
+        run = bisect_right(self.starts, i) - 1
+        lines, lo, _ = self.runs[run]
+        return lines[lo + i - self.starts[run]]
+
+    def __iter__(self):
+        for lines, lo, hi in self.runs:
+            yield from lines[lo:hi]
+
+    def release(self) -> None:
+        for lines in {id(lines): lines for lines, _, _ in self.runs}.values():
+            lines.release()
+
+
+def changes(blocks) -> list:
+    """The (base start, base end, start, end) ranges between matching blocks, what changed."""
+    result = []
+    b = s = 0
+    for i, j, n in blocks:
+        if i > b or j > s:
+            result.append((b, i, s, j))
+        b, s = i + n, j + n
+    return result
+
+
+def regions(changes1, changes2, length):
+    """Walks the changes of both files against a base of length lines in one pass.
+
+    Yields (kind, (start1, end1), (start2, end2)) for consecutive stretches of the
+    merge, with kind 'unchanged', 'left' or 'right' (only that file changed it), or
+    'changed' (both did, the same or not, that's for the caller to tell).
+    """
+    i = j = 0
+    # Lines of each file before the current base position minus the base lines before it
+    delta1 = delta2 = 0
+    position = 0
+    while i < len(changes1) or j < len(changes2):
+        if j == len(changes2) or (i < len(changes1) and changes1[i][0] <= changes2[j][0]):
+            lo = changes1[i][0]
+        else:
+            lo = changes2[j][0]
+        if lo > position:
+            yield 'unchanged', (position + delta1, lo + delta1), (position + delta2, lo + delta2)
+        # Pulls in every change of either file that overlaps or touches the ones pulled in so far
+        hi = lo
+        last1 = last2 = None
+        while True:
+            if i < len(changes1) and changes1[i][0] <= hi:
+                last1 = changes1[i]
+                hi = max(hi, last1[1])
+                i += 1
+            elif j < len(changes2) and changes2[j][0] <= hi:
+                last2 = changes2[j]
+                hi = max(hi, last2[1])
+                j += 1
+            else:
+                break
+        range1 = (lo + delta1, last1[3] + hi - last1[1] if last1 else hi + delta1)
+        range2 = (lo + delta2, last2[3] + hi - last2[1] if last2 else hi + delta2)
+        delta1 = range1[1] - hi
+        delta2 = range2[1] - hi
+        yield 'left' if last2 is None else 'right' if last1 is None else 'changed', range1, range2
+        position = hi
+    if position < length:
+        yield 'unchanged', (position + delta1, length + delta1), (position + delta2, length + delta2)
+
+
+def diff3_files(base, path1, path2, algorithm=DEFAULT_ALGORITHM, jobs=1) -> tuple:
+    """Merges what path1 and path2 changed in base.
+
+    Returns the hunks, how many changes got merged and how many conflicts are left to resolve.
+    The hunks point into two Spliced tables, the merged stretches are in both as common hunks.
+    """
+    lines, lines1 = read_files(base, path1)
+    lines2 = MappedLines(path2)
+    # Both diffs use the -j pool on their own already, running them side by side would only split it
+    blocks = []
+    for other in (lines1, lines2):
+        with span('diff', side=other.path):
+            for _, _, found in file_blocks(lines, other, algorithm, jobs, regions_for(jobs)):
+                pass
+        blocks.append(found)
+
+    with span('diff3'):
+        table1, table2 = Spliced(), Spliced()
+        common = []
+        merged = conflicts = 0
+        for kind, (start1, end1), (start2, end2) in regions(changes(blocks[0]), changes(blocks[1]), len(lines)):
+            if kind == 'changed' and (end1 - start1 != end2 - start2 or
+                                      any(lines1.raw(k) != lines2.raw(k - start1 + start2) for k in range(start1, end1))):
+                # A real conflict, both sides stay as they are
+                table1.add(lines1, start1, end1)
+                table2.add(lines2, start2, end2)
+                conflicts += 1
+                continue
+            if kind != 'unchanged':
+                merged += 1
+            source, start, end = (lines2, start2, end2) if kind == 'right' else (lines1, start1, end1)
+            if end == start:
+                continue
+            if common and common[-1][0] + common[-1][2] == len(table1) and common[-1][1] + common[-1][2] == len(table2):
+                # Right after the last common stretch, it just gets longer
+                common[-1][2] += end - start
+            else:
+                common.append([len(table1), len(table2), end - start])
+            table1.add(source, start, end)
+            table2.add(source, start, end)
+        blocks = [tuple(block) for block in common] + [(len(table1), len(table2), 0)]
+    return build_hunks(table1, table2, blocks), merged, conflicts
@@ -0,0 +1,94 @@
+"""Size bookkeeping for the views."""
+
+from rich.cells import cell_len
+
+from .loader import split_lines
+
+
+class HeightIndex:
+    """Fenwick tree over the heights of the slices in a side view.
+
+    Resolved slices get a height of 0, so prefix sums and lookups by y offset
+    stay O(log n) however many slices have been taken out of the view.
+    """
+
+    def __init__(self, heights) -> None:
+        self.heights = list(heights)
+        self.tree = [0] * (len(self.heights) + 1)
+        for i, height in enumerate(self.heights, 1):
+            self.tree[i] += height
+            parent = i + (i & -i)
+            if parent <= len(self.heights):
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.heights)
+
+    def __len__(self) -> int:
+        return len(self.heights)
+
+    def __getitem__(self, slot) -> int:
+        return self.heights[slot]
+
+    def __setitem__(self, slot, height) -> None:
+        change = height - self.heights[slot]
+        self.heights[slot] = height
+        self.total += change
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] += change
+            i += i & -i
+
+    def prefix(self, slot) -> int:
+        """Total height of the slots before `slot`."""
+        total = 0
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+        return total
+
+    def find(self, y) -> int:
+        """The slot that covers line y of the view, len(self) when y is past the end."""
+        slot, step = 0, 1
+        while step * 2 < len(self.tree):
+            step *= 2
+        while step:
+            if slot + step < len(self.tree) and self.tree[slot + step] <= y:
+                slot += step
+                y -= self.tree[slot]
+            step //= 2
+        return slot
+
+
+class LineMetrics:
+    """Display widths of the lines of a text, built once.
+
+    Widths sit in a segment tree, so the widest line of any range of lines
+    is found in O(log n) instead of going over the text again.
+    """
+
+    def __init__(self, text) -> None:
+        self.widths = [cell_len(line.rstrip('\r\n')) for line in split_lines(text)]
+        self.size = len(self.widths)
+        self.tree = [0] * self.size + self.widths
+        for i in range(self.size - 1, 0, -1):
+            self.tree[i] = max(self.tree[2 * i], self.tree[2 * i + 1])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def max_width(self, start=0, end=None) -> int:
+        """Widest line in [start, end), 0 for an empty range."""
+        if end is None or end > self.size:
+            end = self.size
+        width = 0
+        start += self.size
+        end += self.size
+        while start < end:
+            if start & 1:
+                width = max(width, self.tree[start])
+                start += 1
+            if end & 1:
+                end -= 1
+                width = max(width, self.tree[end])
+            start //= 2
+            end //= 2
+        return width
@@ -0,0 +1,138 @@
+"""Merging a whole list of file pairs.
+
+Pairs are diffed ahead in a process pool, so by the time one pair is merged the next
+one is usually ready. Identical files never get diffed at all.
+"""
+
+import os
+from pathlib import Path
+
+from .diff import DEFAULT_ALGORITHM, opcodes, regions_for
+from .hunks import build_hunks, file_blocks, read_files
+from .loader import digest
+
+
+class Pair:
+    """Two files to be merged, known by the path the merged file gets under the output directory."""
+
+    __slots__ = ('name', 'file1', 'file2', 'future', 'identical', 'conflicts', 'merged')
+
+    def __init__(self, name, file1, file2) -> None:
+        self.name = name
+        self.file1 = file1
+        self.file2 = file2
+        self.future = None
+        self.identical = False
+        # Replaced blocks, None until the pair has been diffed
+        self.conflicts = None
+        self.merged = False
+
+    def __repr__(self) -> str:
+        return 'Pair(%s, %s)' % (self.name, self.status)
+
+    @property
+    def status(self) -> str:
+        if self.file1 is None or self.file2 is None:
+            return 'only in ' + ('second' if self.file1 is None else 'first')
+        if self.identical:
+            return 'identical'
+        if self.merged:
+            return 'merged'
+        if self.conflicts is None:
+            return 'diffing'
+        return '%d conflicts' % self.conflicts
+
+
+def identical(file1, file2) -> bool:
+    """Size first, hashes only when the sizes match."""
+    if os.path.getsize(file1) != os.path.getsize(file2):
+        return False
+    return digest(file1) == digest(file2)
+
+
+def prediff(file1, file2, algorithm):
+    """Runs in the pool: None for identical files, otherwise the matching blocks.
+
+    Hunks would bring maps of both files back with them, two open files for every pair
+    until they're gone. They're built from the blocks once the pair gets merged.
+    """
+    if identical(file1, file2):
+        return None
+    lines1, lines2 = read_files(file1, file2)
+    for _, _, blocks in file_blocks(lines1, lines2, algorithm, 1, regions_for(1)):
+        pass
+    lines1.close()
+    lines2.close()
+    return blocks
+
+
+def walk_pairs(dir1, dir2) -> list:
+    """Pairs up the files in two trees by their path relative to the top."""
+    def files(top):
+        return {os.path.relpath(os.path.join(root, name), top) for root, dirs, names in os.walk(top) for name in names}
+
+    files1, files2 = files(dir1), files(dir2)
+    return [Pair(name, os.path.join(dir1, name) if name in files1 else None, os.path.join(dir2, name) if name in files2 else None)
+            for name in sorted(files1 | files2)]
+
+
+def read_pairs(path) -> list:
+    """Pairs from a list file, one pair per line, split on a tab or else on whitespace.
+
+    Raises ValueError, with the file and line, for a line that isn't two paths.
+    """
+    pairs = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            tabbed = '\t' in line
+            fields = line.split('\t') if tabbed else line.split()
+            if len(fields) != 2:
+                raise ValueError('%s:%d: expected two paths, got %d%s' % (
+                    path, number, len(fields), '' if tabbed else ' (paths with spaces need a tab between them)'))
+            file1, file2 = fields
+            # Under the output directory the merged file goes where the first file is, minus any / or ..
+            parts = [part for part in Path(file1).parts if part not in (Path(file1).anchor, '..', '.')]
+            pairs.append(Pair(os.path.join(*parts), file1, file2))
+    return pairs
+
+
+class PairQueue:
+    """The pairs being merged and the pool diffing them."""
+
+    def __init__(self, pairs, algorithm=DEFAULT_ALGORITHM, jobs=1) -> None:
+        from concurrent.futures import ProcessPoolExecutor
+        self.pairs = pairs
+        self.pool = ProcessPoolExecutor(jobs or None)
+        for pair in pairs:
+            if pair.file1 is not None and pair.file2 is not None:
+                pair.future = self.pool.submit(prediff, pair.file1, pair.file2, algorithm)
+
+    def update(self, pair) -> None:
+        """Fills in what the pool found out about a pair once it's done with it."""
+        if pair.future is not None and pair.future.done() and pair.conflicts is None and not pair.identical:
+            self.settle(pair, pair.future.result())
+
+    def settle(self, pair, blocks) -> None:
+        if blocks is None:
+            pair.identical = True
+        else:
+            # Every replaced block is a replace hunk (see build_hunks)
+            pair.conflicts = sum(1 for code in opcodes(blocks) if code[0] == 'replace')
+
+    def hunks(self, pair) -> list:
+        """The hunks of a pair, waiting for the pool if it isn't there yet, None for identical files.
+
+        They point into maps of both files, hunks.close() them once the pair is done.
+        """
+        blocks = pair.future.result()
+        self.settle(pair, blocks)
+        if blocks is None:
+            return None
+        lines1, lines2 = read_files(pair.file1, pair.file2)
+        return build_hunks(lines1, lines2, blocks)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,17 @@
+"""Where mergepy keeps its own files, and getting rid of them."""
+
+import os
+
+
+def directory(variable, *default) -> str:
+    """The mergepy directory under $variable, or under LOCALAPPDATA or ~/default without it."""
+    base = os.environ.get(variable) or os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), *default)
+    return os.path.join(base, 'mergepy')
+
+
+def remove(path) -> None:
+    """Removes a file, one that's gone already or can't go is left at that."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,83 @@
+"""What the bindings and the layout of a merge are worked out from, kept in one place.
+
+The app brings it up to date after every action, focus change or newly highlighted hunk.
+Which actions are available follows from it alone, check_action doesn't have to look at
+a single widget. Changes aren't acted on as they come in but once, in flush(), when what's
+being handled now is done: however many keys came in, the side views are laid out once
+and the watchers (the app redrawing its footer) run once.
+"""
+
+from .hunks import Kind
+
+SIDES = ('seq1', 'seq2')
+
+
+class MergeState:
+
+    def __init__(self, schedule) -> None:
+        # Runs flush() once what's being handled now is done, App.call_later
+        self.schedule = schedule
+        self.diffing = False
+        # View with the focus, 'seq1', 'seq2', 'merge' or None
+        self.side = 'seq1'
+        # Kind of the highlighted hunk of each side, None when nothing is highlighted
+        self.current = {'seq1': None, 'seq2': None}
+        self.remaining = {'seq1': 0, 'seq2': 0}
+        # Lines in the merged output
+        self.merged = 0
+        self.can_undo = False
+        self.can_redo = False
+        self.watchers = []
+        # Views to lay out on the next flush
+        self.layout = set()
+        self.pending = False
+
+    def update(self, **fields) -> None:
+        for name, value in fields.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                self.changed()
+
+    def relayout(self, view) -> None:
+        """Has view.calibrate_dimensions() called on the next flush."""
+        self.layout.add(view)
+        self.changed()
+
+    def watch(self, callback) -> None:
+        """Calls callback(state) on every flush."""
+        self.watchers.append(callback)
+
+    def changed(self) -> None:
+        if not self.pending:
+            self.pending = True
+            self.schedule(self.flush)
+
+    def flush(self) -> None:
+        self.pending = False
+        layout, self.layout = self.layout, set()
+        for view in layout:
+            if view.is_attached:
+                view.calibrate_dimensions()
+        for callback in self.watchers:
+            callback(self)
+
+    def allows(self, action) -> bool:
+        # Everything but quitting needs the whole diff
+        if self.diffing:
+            return action == 'quit'
+        side = self.side in SIDES
+        if action in ('next_conflict', 'sync', 'replace_keep'):
+            return self.side != 'merge'
+        if action == 'replace':
+            return side and self.current[self.side] is Kind.REPLACE
+        if action in ('keep', 'delete'):
+            return side and self.remaining[self.side] > 0
+        if action in ('keep_to_conflict', 'resolve_all'):
+            return self.remaining['seq1'] + self.remaining['seq2'] > 0
+        if action == 'undo':
+            return self.can_undo
+        if action == 'redo':
+            return self.can_redo
+        if action == 'save':
+            return self.merged > 0
+        return True
@@ -0,0 +1,121 @@
+"""Diffing by words or tokens instead of lines, for minified JSON/JS and other files of a few very long lines.
+
+A line diff of those is one replace hunk of everything. Here both files are cut into
+tokens, the token streams are diffed, and what comes out is cut up again into rows: at
+every newline, wherever a change starts or ends, and between tokens once a row is about
+a screen wide. A row is a piece of a line, the hunks point into tables of rows the way
+they point into the lines of a file, so every change is a hunk of its own and a changed
+value is a replace hunk of just that value.
+"""
+
+import re
+
+from .diff import DEFAULT_ALGORITHM, matching_blocks, opcodes
+from .hunks import build_hunks
+from .trace import span
+
+# What the files get diffed by, lines is the usual line diff
+UNITS = ('lines', 'words', 'tokens')
+
+# A word, a run of spaces, a newline or any other single character
+WORD = re.compile(r'\w+|[^\S\n]+|\n|.')
+
+# Characters after which a row ends at the next token, a megabyte on one line is a lot of rows instead of one very wide one
+ROW_WIDTH = 200
+
+
+def tokenize(text, unit, path) -> list:
+    """text cut into words, or into the tokens of its language (by the file name), ''.join() of them is text again.
+
+    Without a lexer for the file's language (or one that doesn't give back all of it) that's words too.
+    """
+    if unit == 'tokens':
+        from pygments.lexers import get_lexer_for_filename
+        from pygments.util import ClassNotFound
+        try:
+            lexer = get_lexer_for_filename(path, stripnl=False, ensurenl=False)
+        except ClassNotFound:
+            lexer = None
+        if lexer is not None:
+            tokens = [value for _, _, value in lexer.get_tokens_unprocessed(text)]
+            if ''.join(tokens) == text:
+                return tokens
+    return WORD.findall(text)
+
+
+class Rows:
+    """Table of the rows of one file, pieces of its lines.
+
+    Indexing and slicing give the rows as they're shown, each on a line of its own (so
+    ending in a newline). text() gives them as they are, only a row that ends a line of
+    the file ends in a newline there.
+    """
+
+    def __init__(self) -> None:
+        self.rows = []
+
+    def add(self, tokens) -> None:
+        """Adds the rows of a run of tokens, which end at newlines and after ROW_WIDTH characters."""
+        row = []
+        width = 0
+        for token in tokens:
+            if '\n' in token:
+                *lines, token = token.split('\n')
+                for line in lines:
+                    row.append(line + '\n')
+                    self.rows.append(''.join(row))
+                    row = []
+                width = 0
+                if not token:
+                    continue
+            row.append(token)
+            width += len(token)
+            if width >= ROW_WIDTH:
+                self.rows.append(''.join(row))
+                row = []
+                width = 0
+        if row:
+            self.rows.append(''.join(row))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [row if row.endswith('\n') else row + '\n' for row in self.rows[i]]
+        row = self.rows[i]
+        return row if row.endswith('\n') else row + '\n'
+
+    def text(self, start, end) -> str:
+        return ''.join(self.rows[start:end])
+
+
+def read(path) -> str:
+    """The text of a file with its line endings the way MappedLines has them.
+
+    \r\n becomes \n like it does in a line diff (so a merge saves \n line endings either
+    way), a lone \r stays and doesn't end a line. Not what text mode's universal newlines
+    do, which turn a lone \r into \n too.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read().replace('\r\n', '\n')
+
+
+def diff_tokens(path1, path2, unit='words', algorithm=DEFAULT_ALGORITHM, jobs=1) -> list:
+    """Diffs two files by unit ('words' or 'tokens') into hunks of rows."""
+    with span('tokenize', unit=unit):
+        tokens1 = tokenize(read(path1), unit, path1)
+        tokens2 = tokenize(read(path2), unit, path2)
+    blocks = matching_blocks(tokens1, tokens2, algorithm, jobs)
+
+    with span('rows', tokens=len(tokens1) + len(tokens2)):
+        rows1, rows2 = Rows(), Rows()
+        common = []
+        for tag, i1, i2, j1, j2 in opcodes(blocks):
+            start1, start2 = len(rows1), len(rows2)
+            rows1.add(tokens1[i1:i2])
+            rows2.add(tokens2[j1:j2])
+            if tag == 'equal':
+                # The same rows on both sides
+                common.append((start1, start2, len(rows1) - start1))
+    return build_hunks(rows1, rows2, common + [(len(rows1), len(rows2), 0)])
@@ -0,0 +1,197 @@
+"""Timings of where mergepy spends its time, for when it's slow.
+
+Off unless --profile or MERGEPY_TRACE=<file> turns it on. Then every phase (reading
+the files, diffing, building hunks, composing and mounting the views, the first paint,
+every action) is recorded along with widget counts and peak memory, and written out
+at exit. Either as a Chrome trace-event file, which chrome://tracing, Perfetto or
+speedscope open, or (MERGEPY_TRACE_FORMAT=json / --profile-format json) as plain JSON
+with the totals per phase.
+
+With tracing off span() hands back the same do-nothing context manager every time and
+traced() leaves the function as it is, so the hooks cost (next to) nothing. Importing
+this is cheap too, what only tracing needs is imported once it's on.
+"""
+
+import atexit
+import os
+import sys
+import time
+
+FORMATS = ('chrome', 'json')
+
+# The running Tracer, None while tracing is off
+TRACER = None
+
+
+class Null:
+    """What span() gives while tracing is off, the one instance does for every span."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NULL = Null()
+
+
+def peak_rss():
+    """Most memory the process has used so far in bytes, None where that can't be told."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux counts in kilobytes, macOS in bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.tracer.complete(self.name, self.start, time.perf_counter(), self.args)
+
+
+class Tracer:
+    """Events in the Chrome trace-event format, times in microseconds since tracing started."""
+
+    def __init__(self, path, format='chrome') -> None:
+        self.path = path
+        self.format = format
+        self.origin = time.perf_counter()
+        self.events = []
+        # Thread names by id, for the trace viewer to label the rows with
+        self.threads = {}
+
+    def event(self, phase, name, at, **fields) -> dict:
+        import threading
+        thread = threading.current_thread()
+        self.threads[thread.ident] = thread.name
+        event = {'name': name, 'ph': phase, 'ts': (at - self.origin) * 1e6, 'pid': os.getpid(), 'tid': thread.ident}
+        event.update(fields)
+        # list.append is atomic, the diff worker can add events while the UI does too
+        self.events.append(event)
+        return event
+
+    def complete(self, name, start, end, args=None) -> None:
+        self.event('X', name, start, dur=(end - start) * 1e6, args=args or {})
+
+    def mark(self, name, args=None) -> None:
+        self.event('i', name, time.perf_counter(), s='p', args=args or {})
+
+    def counter(self, name, values) -> None:
+        self.event('C', name, time.perf_counter(), args=values)
+
+    def summary(self) -> dict:
+        """Count, total and longest time per phase, when every mark happened, the last value of every counter."""
+        phases, marks, counters = {}, {}, {}
+        for event in self.events:
+            if event['ph'] == 'X':
+                phase = phases.setdefault(event['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+                phase['count'] += 1
+                phase['total_ms'] += event['dur'] / 1000
+                phase['max_ms'] = max(phase['max_ms'], event['dur'] / 1000)
+            elif event['ph'] == 'i':
+                marks.setdefault(event['name'], event['ts'] / 1000)
+            elif event['ph'] == 'C':
+                counters[event['name']] = event['args']
+        return {'phases': phases, 'marks_ms': marks, 'counters': counters}
+
+    def dump(self) -> None:
+        import json
+        meta = {'argv': sys.argv, 'python': sys.version.split()[0], 'peak_rss': peak_rss()}
+        if self.format == 'json':
+            data = dict(meta=meta, **self.summary(), events=self.events)
+        else:
+            names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                     for tid, name in self.threads.items()]
+            data = {'traceEvents': names + self.events, 'displayTimeUnit': 'ms', 'otherData': meta}
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+
+
+def start(path, format=None) -> Tracer:
+    """Starts tracing, written to path when the process exits."""
+    global TRACER
+    if TRACER is None:
+        TRACER = Tracer(path, format or os.environ.get('MERGEPY_TRACE_FORMAT', 'chrome'))
+        atexit.register(TRACER.dump)
+    return TRACER
+
+
+def span(name, **args):
+    """Context manager timing whatever runs inside it as one phase."""
+    if TRACER is None:
+        return NULL
+    return Span(TRACER, name, args)
+
+
+def mark(name, **args) -> None:
+    if TRACER is not None:
+        TRACER.mark(name, args)
+
+
+def sample(app) -> None:
+    """Records how many widgets app has mounted and the peak memory so far."""
+    if TRACER is not None:
+        TRACER.counter('widgets', {'widgets': len(app.query('*'))})
+        rss = peak_rss()
+        if rss is not None:
+            TRACER.counter('peak rss', {'bytes': rss})
+
+
+def traced(name=None, painted=False):
+    """Decorator timing every call as a phase.
+
+    Whether tracing is on is looked at when the function is defined, so a module using
+    this has to be imported after start(). With painted (for methods of a widget or app)
+    the time until the screen got refreshed after the call is recorded too, as '<name> painted'.
+    """
+    def decorate(function):
+        if TRACER is None:
+            return function
+        import functools
+        import inspect
+        label = name or function.__name__
+
+        def paint(widget, started) -> None:
+            def done():
+                TRACER.complete(label + ' painted', started, time.perf_counter())
+                sample(widget.app)
+            widget.call_after_refresh(done)
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                with Span(TRACER, label, {}):
+                    result = await function(*args, **kwargs)
+                if painted:
+                    paint(args[0], started)
+                return result
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                with Span(TRACER, label, {}):
+                    result = function(*args, **kwargs)
+                if painted:
+                    paint(args[0], started)
+                return result
+        return wrapper
+    return decorate
+
+
+if os.environ.get('MERGEPY_TRACE'):
+    start(os.environ['MERGEPY_TRACE'])
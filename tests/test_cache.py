@@ -0,0 +1,43 @@
+import os
+
+from mergepy import cache
+
+DIGEST1 = b'\1' * 32
+DIGEST2 = b'\2' * 32
+BLOCKS = [(0, 0, 5), (7, 6, 100), (2 ** 40, 2 ** 40 + 3, 1), (2 ** 40 + 9, 2 ** 40 + 9, 0)]
+
+
+def test_round_trip():
+    assert cache.load(DIGEST1, DIGEST2, 'myers', 16) is None
+    cache.store(DIGEST1, DIGEST2, 'myers', 16, BLOCKS)
+    assert cache.load(DIGEST1, DIGEST2, 'myers', 16) == BLOCKS
+    # Any other part of the key is another diff
+    assert cache.load(DIGEST2, DIGEST1, 'myers', 16) is None
+    assert cache.load(DIGEST1, DIGEST2, 'patience', 16) is None
+    assert cache.load(DIGEST1, DIGEST2, 'myers', 32) is None
+
+
+def test_broken_entry_goes():
+    cache.store(DIGEST1, DIGEST2, 'myers', 16, BLOCKS)
+    path = cache.entry(DIGEST1, DIGEST2, 'myers', 16)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert cache.load(DIGEST1, DIGEST2, 'myers', 16) is None
+    assert not os.path.exists(path)
+
+
+def test_off(monkeypatch):
+    monkeypatch.setenv('MERGEPY_CACHE_SIZE', '0')
+    cache.store(DIGEST1, DIGEST2, 'myers', 16, BLOCKS)
+    assert cache.load(DIGEST1, DIGEST2, 'myers', 16) is None
+
+
+def test_evicts_least_recently_used():
+    cache.store(DIGEST1, DIGEST2, 'myers', 16, BLOCKS)
+    first = cache.entry(DIGEST1, DIGEST2, 'myers', 16)
+    os.utime(first, (0, 0))
+    cache.store(DIGEST1, DIGEST2, 'patience', 16, BLOCKS)
+    second = cache.entry(DIGEST1, DIGEST2, 'patience', 16)
+    cache.evict(os.path.getsize(second))
+    assert not os.path.exists(first)
+    assert cache.load(DIGEST1, DIGEST2, 'patience', 16) == BLOCKS
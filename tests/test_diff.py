@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from mergepy.diff import ALGORITHMS, intraline, matching_blocks, opcodes
+
+
+def lcs(a, b) -> int:
+    """Length of the longest common subsequence, the slow way."""
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b):
+            previous, row[j + 1] = row[j + 1], previous + 1 if x == y else max(row[j + 1], row[j])
+    return row[-1]
+
+
+def pairs(count):
+    r = random.Random(0)
+    for _ in range(count):
+        a = [r.randrange(6) for _ in range(r.randrange(40))]
+        b = list(a)
+        for _ in range(r.randrange(8)):
+            k = r.randrange(len(b) + 1)
+            if r.random() < 0.5 and k < len(b):
+                del b[k]
+            else:
+                b.insert(k, r.randrange(8))
+        yield a, b
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_blocks_are_valid(algorithm):
+    for a, b in pairs(200):
+        blocks = matching_blocks(a, b, algorithm)
+        assert blocks[-1] == (len(a), len(b), 0)
+        i = j = 0
+        for ai, bj, size in blocks:
+            assert ai >= i and bj >= j
+            assert a[ai:ai + size] == b[bj:bj + size]
+            i, j = ai + size, bj + size
+        # The opcodes cover both sides from start to end
+        codes = opcodes(blocks)
+        assert sum(i2 - i1 for _, i1, i2, _, _ in codes) == len(a)
+        assert sum(j2 - j1 for _, _, _, j1, j2 in codes) == len(b)
+
+
+def test_myers_is_minimal():
+    for a, b in pairs(200):
+        assert sum(size for _, _, size in matching_blocks(a, b, 'myers')) == lcs(a, b)
+
+
+def test_lines():
+    a = ['one\n', 'two\n', 'three\n', 'four\n']
+    b = ['one\n', 'three\n', 'four\n', 'five\n']
+    for algorithm in ALGORITHMS:
+        assert opcodes(matching_blocks(a, b, algorithm)) == [
+            ('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1), ('equal', 2, 4, 1, 3), ('insert', 4, 4, 3, 4)]
+
+
+def test_intraline():
+    assert intraline('a = 1\nb = 2\n', 'a = 1\nb = 3\n') == ([(1, 4, 5)], [(1, 4, 5)])
+    # A form feed doesn't end a line
+    assert intraline('a\fb = 1\n', 'a\fb = 2\n') == ([(0, 6, 7)], [(0, 6, 7)])
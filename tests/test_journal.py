@@ -0,0 +1,88 @@
+from mergepy.buffer import MergeBuffer
+from mergepy.history import Step
+from mergepy.hunks import Kind, close, diff_files
+from mergepy.journal import Journal
+from mergepy.tokens import diff_tokens
+
+
+class Merge:
+    """Keeps hunks and undoes steps the way the app does, journaling them."""
+
+    def __init__(self, journal, hunks) -> None:
+        self.journal = journal
+        self.buffer = MergeBuffer()
+        self.done = []
+        journal.start(hunks)
+
+    def keep(self, *hunks) -> None:
+        texts = [hunk.text() for hunk in hunks]
+        step = Step('keep', tuple(hunk.id for hunk in hunks), len(self.buffer), MergeBuffer.count(*texts), len(texts))
+        self.journal.record(step)
+        self.done.append(step)
+        self.buffer.append(*texts)
+
+    def undo(self) -> None:
+        step = self.done.pop()
+        self.journal.undo()
+        self.buffer.truncate(len(self.buffer) - step.offset)
+
+
+def replay(path1, path2, merge, unit='lines'):
+    merge.journal.close()
+    session = Journal(path1, path2, unit=unit).replay()
+    assert session is not None
+    assert ''.join(session.texts()) == str(merge.buffer)
+    return session
+
+
+def write(tmp_path, text1, text2):
+    path1, path2 = tmp_path / 'one', tmp_path / 'two'
+    path1.write_text(text1)
+    path2.write_text(text2)
+    return str(path1), str(path2)
+
+
+def test_replay_after_undo(tmp_path):
+    path1, path2 = write(tmp_path, 'a\nb\nc\nd\ne\n', 'a\nB\nc\nd\nE\n')
+    hunks = diff_files(path1, path2)
+    merge = Merge(Journal(path1, path2), hunks)
+    first, replaced, common = hunks[0], hunks[2], hunks[4]
+    merge.keep(first)
+    merge.keep(replaced)
+    merge.keep(common)
+    merge.undo()
+    merge.undo()
+    merge.keep(replaced.peer)
+    session = replay(path1, path2, merge)
+    assert str(merge.buffer) == 'a\nB\n'
+    assert session.steps == 6
+    assert {hunk.id for hunk in session.resolved} == {first.id, replaced.peer.id}
+    close(hunks + session.hunks)
+
+
+def test_token_replay_after_undo(tmp_path):
+    # Lines longer than a row, so a hunk has more rows than the output gets lines
+    words = ['w%d' % i for i in range(100)]
+    line = ' '.join(words) + '\n'
+    changed = ' '.join(words[:50] + ['changed'] + words[51:]) + '\n'
+    path1, path2 = write(tmp_path, line + line + line, line + changed + line)
+    hunks = diff_tokens(path1, path2, 'words')
+    common = [hunk for hunk in hunks if hunk.kind is Kind.COMMON and hunk.side == 'seq1']
+    assert any(len(hunk) != MergeBuffer.count(hunk.text()) for hunk in common)
+
+    merge = Merge(Journal(path1, path2, unit='words'), hunks)
+    merge.keep(common[0])
+    merge.keep(common[1])
+    merge.undo()
+    replay(path1, path2, merge, 'words')
+    assert str(merge.buffer) == common[0].text()
+
+
+def test_no_steps_no_session(tmp_path):
+    path1, path2 = write(tmp_path, 'a\n', 'b\n')
+    hunks = diff_files(path1, path2)
+    journal = Journal(path1, path2)
+    journal.start(hunks)
+    journal.close()
+    assert Journal(path1, path2).replay() is None
+    close(hunks)
@@ -0,0 +1,59 @@
+import pytest
+
+from mergepy.auto import resolve
+from mergepy.diff import ALGORITHMS
+from mergepy.hunks import Kind
+from mergepy.merge3 import diff3_files
+
+BASE = ['line %d\n' % i for i in range(20)]
+
+
+def write(tmp_path, name, lines):
+    path = tmp_path / name
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS)
+def test_edits_apart_merge(tmp_path, algorithm):
+    ours = list(BASE)
+    ours[2] = 'ours\n'
+    del ours[5]
+    theirs = list(BASE)
+    theirs[12] = 'theirs\n'
+    theirs.insert(18, 'more\n')
+    expect = list(ours)
+    expect[11] = 'theirs\n'
+    expect.insert(17, 'more\n')
+
+    hunks, merged, conflicts = diff3_files(write(tmp_path, 'base', BASE), write(tmp_path, 'ours', ours),
+                                           write(tmp_path, 'theirs', theirs), algorithm)
+    assert (merged, conflicts) == (4, 0)
+    assert all(hunk.kind is Kind.COMMON for hunk in hunks)
+    for policy in ('left', 'right', 'fail-on-conflict'):
+        assert ''.join(hunk.text() for hunk in resolve(hunks, policy)) == ''.join(expect)
+
+
+def test_same_edit_merges(tmp_path):
+    ours = list(BASE)
+    ours[3] = 'both\n'
+    hunks, merged, conflicts = diff3_files(write(tmp_path, 'base', BASE), write(tmp_path, 'ours', ours),
+                                           write(tmp_path, 'theirs', ours))
+    assert (merged, conflicts) == (1, 0)
+    assert ''.join(hunk.text() for hunk in resolve(hunks, 'left')) == ''.join(ours)
+
+
+def test_edits_on_the_same_lines_conflict(tmp_path):
+    ours = list(BASE)
+    ours[7] = 'ours\n'
+    theirs = list(BASE)
+    theirs[7] = 'theirs\n'
+    theirs[15] = 'theirs too\n'
+    hunks, merged, conflicts = diff3_files(write(tmp_path, 'base', BASE), write(tmp_path, 'ours', ours),
+                                           write(tmp_path, 'theirs', theirs))
+    assert (merged, conflicts) == (1, 1)
+    assert resolve(hunks, 'fail-on-conflict') is None
+    left = list(theirs)
+    left[7] = 'ours\n'
+    assert ''.join(hunk.text() for hunk in resolve(hunks, 'left')) == ''.join(left)
+    assert ''.join(hunk.text() for hunk in resolve(hunks, 'right')) == ''.join(theirs)